@@ -1,25 +1,60 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query as QueryParam
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Literal, Optional
 from confluent_kafka import Producer
+from pydantic import ValidationError
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import asyncio
 import json
-import uuid
-from qdrant_client import QdrantClient
-import numpy as np
-import networkx as nx
-from sklearn.neighbors import NearestNeighbors
-
-from backend.app.models.paper import Paper
-from backend.app.models.query import Query
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http import models
+
+from backend.app.models.paper import Paper, PaperStatusRequest
+from backend.app.models.query import Query, QueryBatch
 from backend.app.services.openai_handler import OpenAIHandler
+from backend.app.services.embedding_cache import embedding_cache
+from backend.app.services.knn_graph import knn_graph
+from backend.app.services.lexical_index import lexical_index, reciprocal_rank_fusion
+from backend.app.services.dedup_index import new_dedup_index
+from backend.app.services.query_cache import ingest_version, query_cache
+from backend.app.services.collection_config import search_params, build_filter
+from backend.app.services.metrics import GRAPH_BUILD_SECONDS
+from backend.app.services.clients import get_producer, get_qdrant, services
+from backend.app.services.tracing import new_trace_headers
+from backend.app.services.status_tracker import (
+    FINAL_STATUSES, iter_status_events, status_consumer, status_table
+)
 from backend.app.core.config import settings
 
 router = APIRouter()
 
-# Initialize services
-producer = Producer({
-    'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS
-})
+# Bloom filter of stored paper ids, warmed in the background at startup
+dedup_index = new_dedup_index()
 
-qdrant = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+async def warm_dedup_index():
+    try:
+        await dedup_index.aload(services.qdrant)
+        print(f"Dedup index loaded with {dedup_index.size} paper ids")
+    except Exception as e:
+        print(f"Error loading dedup index: {str(e)}")
+
+async def find_existing(qdrant, paper_ids) -> set:
+    """Return the ids already stored, querying Qdrant only for bloom filter positives"""
+    candidates = [paper_id for paper_id in paper_ids if dedup_index.might_contain(paper_id)]
+    if not candidates:
+        return set()
+    try:
+        points = await qdrant.retrieve(
+            collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+            ids=candidates,
+            with_payload=False,
+            with_vectors=False
+        )
+    except Exception as e:
+        # Dedup is only an optimization; never block ingestion on it
+        print(f"Dedup lookup failed: {str(e)}")
+        return set()
+    return {str(point.id) for point in points}
 
 def delivery_report(err, msg):
     if err is not None:
@@ -27,71 +62,530 @@ def delivery_report(err, msg):
     else:
         print(f'Message delivered to {msg.topic()} [{msg.partition()}]')
 
+def bulk_delivery_report(err, msg):
+    # Per-message success logging would dominate bulk loads, so only report failures
+    if err is not None:
+        print(f'Message delivery failed: {err}')
+
+async def produce_paper(producer: Producer, paper: Paper, callback=delivery_report) -> str:
+    """Queue a paper on the processing topic and return its id.
+
+    Raises 503 if the producer's local queue stays full for
+    KAFKA_PRODUCE_MAX_RETRIES retries.
+    """
+    paper_id = paper.paper_id()
+
+    # Prepare message for Kafka
+    message = {
+        "paper_id": paper_id,
+        "title": paper.title,
+        "authors": paper.authors,
+        "abstract": paper.abstract,
+        "published": paper.published,
+        "link": paper.link
+    }
+    value = json.dumps(message).encode('utf-8')
+    # Start the paper's ingest trace; the worker ends it once the paper is searchable
+    headers = new_trace_headers()
+    attempt = 0
+    while True:
+        try:
+            producer.produce(
+                settings.KAFKA_PROCESSING_TOPIC,
+                value,
+                key=paper.partition_key(),
+                headers=headers,
+                callback=callback
+            )
+            break
+        except BufferError:
+            attempt += 1
+            if attempt > settings.KAFKA_PRODUCE_MAX_RETRIES:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Kafka producer queue is full, retry later",
+                    headers={"Retry-After": "1"}
+                )
+            # Local queue is full; serve delivery callbacks without blocking the event loop
+            producer.poll(0)
+            await asyncio.sleep(settings.KAFKA_PRODUCE_RETRY_SECONDS)
+    producer.poll(0)
+    status_table.update(paper_id, "processing")
+    return paper_id
+
 @router.post("/add_paper")
-async def add_paper(paper: Paper):
+async def add_paper(
+    paper: Paper,
+    producer: Producer = Depends(get_producer),
+    qdrant: AsyncQdrantClient = Depends(get_qdrant)
+):
     try:
-        paper_id = str(uuid.uuid4())
-        
-        # Prepare message for Kafka
-        message = {
-            "paper_id": paper_id,
-            "title": paper.title,
-            "authors": paper.authors,
-            "abstract": paper.abstract,
-            "published": paper.published,
-            "link": paper.link
-        }
+        # Short-circuit papers that are already stored
+        paper_id = paper.paper_id()
+        if paper_id in await find_existing(qdrant, [paper_id]):
+            return {"paper_id": paper_id, "status": "duplicate"}
+
         # Send to Kafka topic
-        producer.produce(
-            'paper_processing',
-            json.dumps(message).encode('utf-8'),
-            callback=delivery_report
-        )
-        producer.poll(0)
+        await produce_paper(producer, paper)
         
         return {"paper_id": paper_id, "status": "processing"}
     
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _iter_bulk_items(request: Request):
+    """Yield raw paper objects from an NDJSON stream or a JSON array body"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of papers")
+        for item in body:
+            yield item
+
+BULK_DEDUP_CHUNK = 500
+
+@router.post("/add_papers")
+async def add_papers(
+    request: Request,
+    producer: Producer = Depends(get_producer),
+    qdrant: AsyncQdrantClient = Depends(get_qdrant)
+):
+    """Bulk submit papers as a JSON array or an NDJSON stream (application/x-ndjson)"""
+    try:
+        results = []
+        pending = []
+        seen = set()
+        counts = {"accepted": 0, "duplicate": 0, "rejected": 0}
+
+        async def flush_pending():
+            # One exact duplicate lookup per chunk instead of per paper
+            existing = await find_existing(qdrant, [paper_id for _, _, paper_id in pending])
+            for index, paper, paper_id in pending:
+                if paper_id in existing or paper_id in seen:
+                    results[index] = {"paper_id": paper_id, "status": "duplicate"}
+                    counts["duplicate"] += 1
+                else:
+                    await produce_paper(producer, paper, callback=bulk_delivery_report)
+                    seen.add(paper_id)
+                    results[index] = {"paper_id": paper_id, "status": "processing"}
+                    counts["accepted"] += 1
+            pending.clear()
+
+        async for item in _iter_bulk_items(request):
+            try:
+                if isinstance(item, bytes):
+                    paper = Paper.model_validate_json(item)
+                else:
+                    paper = Paper.model_validate(item)
+            except ValidationError as e:
+                results.append({"error": e.errors(include_url=False, include_context=False)})
+                counts["rejected"] += 1
+                continue
+            pending.append((len(results), paper, paper.paper_id()))
+            results.append(None)
+            if len(pending) >= BULK_DEDUP_CHUNK:
+                await flush_pending()
+        await flush_pending()
+
+        # Wait for the batched messages to leave the local queue without blocking the loop
+        remaining = await asyncio.to_thread(producer.flush, 30)
+
+        return {
+            **counts,
+            "pending": remaining,
+            "status": "processing",
+            "results": results
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def format_match(payload, paper_id, similarity):
+    return {
+        'paper_id': paper_id,
+        'title': payload['title'],
+        'abstract': payload['abstract'],
+        'link': payload['link'],
+        'similarity': similarity
+    }
+
+async def filter_ids(qdrant, paper_ids, query_filter):
+    """Keep the ids whose payload passes query_filter, preserving their order"""
+    if query_filter is None or not paper_ids:
+        return paper_ids
+    points, _ = await qdrant.scroll(
+        collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+        scroll_filter=models.Filter(
+            must=[*query_filter.must, models.HasIdCondition(has_id=paper_ids)]
+        ),
+        limit=len(paper_ids),
+        with_payload=False,
+        with_vectors=False
+    )
+    allowed = {str(point.id) for point in points}
+    return [paper_id for paper_id in paper_ids if paper_id in allowed]
+
+async def hybrid_search(qdrant, query_text, query_embedding, top_k, query_filter=None):
+    """Fuse vector and BM25 rankings with reciprocal rank fusion"""
+    depth = max(top_k, settings.HYBRID_CANDIDATES)
+    vector_hits, lexical_hits = await asyncio.gather(
+        qdrant.search(
+            collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+            query_vector=query_embedding,
+            query_filter=query_filter,
+            limit=depth,
+            search_params=search_params()
+        ),
+        asyncio.to_thread(lexical_index.search, query_text, depth)
+    )
+    # The BM25 index holds no payload, so its candidates are filtered in Qdrant
+    lexical_ids = await filter_ids(qdrant, [paper_id for paper_id, _ in lexical_hits], query_filter)
+    fused = reciprocal_rank_fusion(
+        [[str(hit.id) for hit in vector_hits], lexical_ids],
+        settings.HYBRID_RRF_K
+    )[:top_k]
+
+    matches = {str(hit.id): (hit.payload, float(hit.score)) for hit in vector_hits}
+    missing = [paper_id for paper_id, _ in fused if paper_id not in matches]
+    if missing:
+        # Keyword-only hits: fetch payloads and score them against the query vector too
+        import numpy as np
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+        for point in await qdrant.retrieve(
+            collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+            ids=missing,
+            with_payload=True,
+            with_vectors=True
+        ):
+            vector = np.asarray(point.vector, dtype=np.float32)
+            similarity = float(vector @ query_vector) / max(float(np.linalg.norm(vector)), 1e-12)
+            matches[str(point.id)] = (point.payload, similarity)
+
+    results = []
+    for paper_id, score in fused:
+        if paper_id not in matches:
+            # Indexed by the worker but since removed from Qdrant
+            continue
+        payload, similarity = matches[paper_id]
+        results.append({**format_match(payload, paper_id, similarity), 'score': score})
+    return results
+
+def query_cache_key(query: Query) -> tuple:
+    return query_cache.make_key(
+        "query", query.query_text, query.top_k, query.mode,
+        query.filter.model_dump_json() if query.filter else None
+    )
+
 @router.post("/query")
-async def query_papers(query: Query):
+async def query_papers(query: Query, qdrant: AsyncQdrantClient = Depends(get_qdrant)):
     try:
+        # Serve repeated queries without touching OpenAI or Qdrant
+        cache_key = query_cache_key(query)
+        # Read before searching, so papers ingested during the search invalidate the entry
+        version = ingest_version.current()
+        if settings.QUERY_CACHE_ENABLED:
+            cached = query_cache.get(cache_key, version)
+            if cached is not None:
+                return cached
+
         # Generate embedding for query
-        query_embedding = OpenAIHandler.generate_embedding(query.query_text)
-        
-        # Search in Qdrant
-        search_results = qdrant.search(
-            collection_name='papers',
-            query_vector=query_embedding,
-            limit=query.top_k
+        query_embedding = await OpenAIHandler.agenerate_embedding(query.query_text)
+        # Filters run inside the HNSW search on indexed payload fields
+        query_filter = build_filter(query.filter)
+
+        if query.mode == "hybrid":
+            results = await hybrid_search(qdrant, query.query_text, query_embedding, query.top_k, query_filter)
+        else:
+            # Search in Qdrant
+            search_results = await qdrant.search(
+                collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                query_vector=query_embedding,
+                query_filter=query_filter,
+                limit=query.top_k,
+                search_params=search_params()
+            )
+            results = [
+                format_match(match.payload, str(match.id), float(match.score))
+                for match in search_results
+            ]
+        
+        response = {"results": results}
+        if settings.QUERY_CACHE_ENABLED:
+            query_cache.put(cache_key, response, version)
+        return response
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query_batch")
+async def query_papers_batch(batch: QueryBatch, qdrant: AsyncQdrantClient = Depends(get_qdrant)):
+    """Run many queries with one embedding call and one Qdrant batch search.
+
+    Results are returned in input order, each in the same shape as /query.
+    """
+    if len(batch.queries) > settings.QUERY_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.QUERY_BATCH_MAX_QUERIES} queries per batch"
         )
-        
-        # Format results
+    try:
+        responses = [None] * len(batch.queries)
+        cache_keys = [query_cache_key(query) for query in batch.queries]
+        # Read before searching, so papers ingested during the search invalidate the entries
+        version = ingest_version.current()
+        if settings.QUERY_CACHE_ENABLED:
+            for i, key in enumerate(cache_keys):
+                responses[i] = query_cache.get(key, version)
+        pending = [i for i, response in enumerate(responses) if response is None]
+
+        if pending:
+            # Embedding is cache-aware and deduplicates repeated texts
+            embeddings = await OpenAIHandler.agenerate_embeddings(
+                [batch.queries[i].query_text for i in pending]
+            )
+            vector_jobs = []
+            hybrid_jobs = []
+            for i, embedding in zip(pending, embeddings):
+                query = batch.queries[i]
+                if query.mode == "hybrid":
+                    hybrid_jobs.append((i, hybrid_search(
+                        qdrant, query.query_text, embedding, query.top_k, build_filter(query.filter)
+                    )))
+                else:
+                    vector_jobs.append((i, models.SearchRequest(
+                        vector=embedding,
+                        filter=build_filter(query.filter),
+                        limit=query.top_k,
+                        params=search_params(),
+                        with_payload=True
+                    )))
+
+            async def run_vector_jobs():
+                if not vector_jobs:
+                    return []
+                return await qdrant.search_batch(
+                    collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                    requests=[request for _, request in vector_jobs]
+                )
+
+            vector_results, *hybrid_results = await asyncio.gather(
+                run_vector_jobs(), *(job for _, job in hybrid_jobs)
+            )
+            for (i, _), search_results in zip(vector_jobs, vector_results):
+                responses[i] = {"results": [
+                    format_match(match.payload, str(match.id), float(match.score))
+                    for match in search_results
+                ]}
+            for (i, _), results in zip(hybrid_jobs, hybrid_results):
+                responses[i] = {"results": results}
+
+            if settings.QUERY_CACHE_ENABLED:
+                for i in pending:
+                    query_cache.put(cache_keys[i], responses[i], version)
+
+        return {"results": [response["results"] for response in responses]}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/papers/{paper_id}/neighbors")
+async def get_paper_neighbors(
+    paper_id: str,
+    limit: int = QueryParam(5, ge=1, le=settings.NEIGHBORS_MAX_LIMIT),
+    hops: int = 1,
+    exclude: Optional[List[str]] = QueryParam(None),
+    qdrant: AsyncQdrantClient = Depends(get_qdrant)
+):
+    """Papers most similar to a stored paper, found from its stored vector (no embedding call).
+
+    With hops > 1 each hop expands the previous hop's papers in one batched
+    recommend request and keeps the `limit` best new papers, so a call
+    returns at most limit * hops papers. Papers in exclude (e.g. already
+    shown) and papers reached on an earlier hop are never returned.
+    """
+    if not 1 <= hops <= settings.NEIGHBORS_MAX_HOPS:
+        raise HTTPException(
+            status_code=400, detail=f"hops must be between 1 and {settings.NEIGHBORS_MAX_HOPS}"
+        )
+    if exclude and len(exclude) > settings.NEIGHBORS_MAX_EXCLUDE:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.NEIGHBORS_MAX_EXCLUDE} ids can be excluded"
+        )
+    try:
+        source = await qdrant.retrieve(
+            collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+            ids=[paper_id],
+            with_payload=True,
+            with_vectors=False
+        )
+        if not source:
+            raise HTTPException(status_code=404, detail="Paper not found")
+
+        seen = {paper_id, *(exclude or [])}
+        frontier = [paper_id]
         results = []
-        for match in search_results:
-            results.append({
-                'paper_id': str(match.id),
-                'title': match.payload['title'],
-                'abstract': match.payload['abstract'],
-                'link': match.payload['link'],
-                'similarity': float(match.score)
-            })
-        
-        return {"results": results}
-    
+        for hop in range(1, hops + 1):
+            # One exclusion filter shared by every request of the hop
+            exclusion = models.Filter(must_not=[models.HasIdCondition(has_id=list(seen))])
+            responses = await qdrant.recommend_batch(
+                collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                requests=[
+                    models.RecommendRequest(
+                        positive=[parent],
+                        filter=exclusion,
+                        limit=limit,
+                        params=search_params(),
+                        with_payload=True
+                    )
+                    for parent in frontier
+                ]
+            )
+            # Keep only the best `limit` new papers per hop, so the fan-out stays limit * hops
+            candidates = {}
+            for parent, matches in zip(frontier, responses):
+                for match in matches:
+                    neighbor_id = str(match.id)
+                    # Two parents in the same hop can share a neighbour
+                    if neighbor_id in seen:
+                        continue
+                    if neighbor_id not in candidates or match.score > candidates[neighbor_id][0].score:
+                        candidates[neighbor_id] = (match, parent)
+            best = sorted(candidates.items(), key=lambda item: item[1][0].score, reverse=True)[:limit]
+            frontier = []
+            for neighbor_id, (match, parent) in best:
+                seen.add(neighbor_id)
+                frontier.append(neighbor_id)
+                results.append({
+                    **format_match(match.payload, neighbor_id, float(match.score)),
+                    "hop": hop,
+                    "parent": parent
+                })
+            if not frontier:
+                break
+
+        payload = source[0].payload
+        return {
+            "paper": {
+                "paper_id": paper_id,
+                "title": payload["title"],
+                "abstract": payload["abstract"],
+                "link": payload["link"]
+            },
+            "results": results
+        }
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def resolve_stored(qdrant, paper_ids):
+    """Mark papers already in Qdrant completed, for ids whose status events this process never saw"""
+    for paper_id in await find_existing(qdrant, paper_ids):
+        status_table.update(paper_id, "completed")
+
+@router.get("/papers/{paper_id}/status")
+async def get_paper_status(
+    paper_id: str,
+    wait: float = 0,
+    qdrant: AsyncQdrantClient = Depends(get_qdrant)
+):
+    """Ingestion status of a submitted paper: processing, completed, duplicate or error.
+
+    With wait > 0 the request long-polls, up to STATUS_WAIT_MAX_SECONDS, until
+    the paper reaches a final status.
+    """
+    try:
+        if status_table.get(paper_id) is None:
+            await resolve_stored(qdrant, [paper_id])
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(max(wait, 0), settings.STATUS_WAIT_MAX_SECONDS)
+        entry = status_table.get(paper_id)
+        if entry is None or entry["status"] not in FINAL_STATUSES:
+            queue = status_table.subscribe([paper_id])
+            try:
+                while (entry is None or entry["status"] not in FINAL_STATUSES) and loop.time() < deadline:
+                    try:
+                        await asyncio.wait_for(queue.get(), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                    entry = status_table.get(paper_id)
+            finally:
+                status_table.unsubscribe([paper_id], queue)
+
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Unknown paper id")
+        return entry
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/papers/status/stream")
+async def stream_paper_status(
+    request: PaperStatusRequest,
+    timeout: float = settings.STATUS_STREAM_MAX_SECONDS,
+    qdrant: AsyncQdrantClient = Depends(get_qdrant)
+):
+    """Server-sent status events for a batch submission until every paper is final or timeout"""
+    paper_ids = list(dict.fromkeys(request.paper_ids))
+    if len(paper_ids) > settings.STATUS_STREAM_MAX_PAPERS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.STATUS_STREAM_MAX_PAPERS} papers per stream"
+        )
+    # Subscribe first so no event between the lookup and the stream is missed
+    queue = status_table.subscribe(paper_ids)
+    try:
+        unknown = [paper_id for paper_id in paper_ids if status_table.get(paper_id) is None]
+        if unknown:
+            await resolve_stored(qdrant, unknown)
+    except Exception as e:
+        status_table.unsubscribe(paper_ids, queue)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        iter_status_events(
+            status_table, paper_ids, queue, min(max(timeout, 0), settings.STATUS_STREAM_MAX_SECONDS)
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @router.post("/search_graph")
-async def get_search_graph(query: Query):
+async def get_search_graph(query: Query, qdrant: AsyncQdrantClient = Depends(get_qdrant)):
+    # The graph stack (numpy, networkx, scikit-learn) loads on the first graph request
+    from backend.app.services.graph_builder import build_search_graph, run_graph_task
     try:
         # First get search results
-        query_embedding = OpenAIHandler.generate_embedding(query.query_text)
-        search_results = qdrant.search(
+        query_embedding = await OpenAIHandler.agenerate_embedding(query.query_text)
+        search_results = await qdrant.search(
             collection_name=settings.VECTOR_DB_COLLECTION_NAME,
             query_vector=query_embedding,
+            query_filter=build_filter(query.filter),
             limit=query.top_k,
+            search_params=search_params(),
             with_vectors=True  # Make sure to get vectors
         )
         
@@ -107,235 +601,143 @@ async def get_search_graph(query: Query):
                 'similarity': float(match.score)
             })
         
-        # Extract vectors and metadata from search results
-        # Reshape vectors to 2D array
-        vectors = np.array([result.vector for result in search_results])
-        if vectors.ndim == 1:
-            vectors = vectors.reshape(-1, 1)  # Reshape to 2D array
-            
-        titles = [result.payload["title"][:50] + "..." if len(result.payload["title"]) > 50 
-                 else result.payload["title"] for result in search_results]
-        paper_ids = [result.id for result in search_results]
-        
-        # Make sure we have enough samples for k neighbors
-        n_neighbors = min(5, len(vectors))
-        if n_neighbors < 2:
-            # If we have too few results, return simple data without graph
-            return {
-                "message": "Not enough results for graph visualization",
-                "results": [{"title": title, "id": paper_id} 
-                           for title, paper_id in zip(titles, paper_ids)]
-            }
-            
-        nn = NearestNeighbors(n_neighbors=n_neighbors)
-        nn.fit(vectors)
-        distances, indices = nn.kneighbors(vectors)
-        
-        # Create graph
-        G = nx.Graph()
-        
-        # Add nodes
-        for i, (title, paper_id) in enumerate(zip(titles, paper_ids)):
-            G.add_node(
-                i,
-                title=title,
-                paper_id=paper_id,
-                size=10
-            )
-        
-        # Add edges with similarity weights
-        for i, neighbors in enumerate(indices):
-            for j, dist in zip(neighbors[1:], distances[i][1:]):
-                similarity = 1 - dist
-                if similarity > 0.5:  # Only show strong connections
-                    G.add_edge(i, j, weight=similarity)
-        
-        # Calculate node sizes based on connections
-        for node in G.nodes():
-            G.nodes[node]['size'] = 10 + 5 * G.degree(node)
-        
-        # Get positions
-        pos = nx.spring_layout(G, k=1/np.sqrt(len(G.nodes())), iterations=100, seed=42)
-        
-        # Create edge traces
-        edge_traces = []
-        for edge in G.edges():
-            x0, y0 = pos[edge[0]]
-            x1, y1 = pos[edge[1]]
-            weight = G.edges[edge]['weight']
-            
-            edge_trace = {
-                'x': [x0, x1, None],
-                'y': [y0, y1, None],
-                'mode': 'lines',
-                'line': {
-                    'width': weight * 3,
-                    'color': f'rgba(70, 130, 180, {weight})'
-                },
-                'hoverinfo': 'none'
-            }
-            edge_traces.append(edge_trace)
-        
-        # Create node trace
-        node_trace = {
-            'x': [pos[node][0] for node in G.nodes()],
-            'y': [pos[node][1] for node in G.nodes()],
-            'mode': 'markers+text',
-            'marker': {
-                'size': [G.nodes[node]['size'] for node in G.nodes()],
-                'color': '#1f77b4',
-                'line': {'width': 1, 'color': 'white'},
-                'opacity': 0.8
-            },
-            'text': titles,
-            'textposition': 'top center',
-            'textfont': {'size': 10, 'color': '#666'},
-            'hovertext': [
-                f"Title: {title}<br>"
-                f"ID: {paper_id}<br>"
-                f"Connections: {G.degree(i)}"
-                for i, (title, paper_id) in enumerate(zip(titles, paper_ids))
-            ],
-            'hoverinfo': 'text'
-        }
-        
-        # Create layout
-        layout = {
-            'showlegend': False,
-            'hovermode': 'closest',
-            'margin': {'b': 40, 'l': 40, 'r': 40, 't': 40},
-            'title': {
-                'text': f'Paper Similarity Network for "{query.query_text}"',
-                'font': {'size': 24, 'color': '#333'}
-            },
-            'plot_bgcolor': '#fff',
-            'paper_bgcolor': '#fff',
-            'xaxis': {
-                'showgrid': False,
-                'zeroline': False,
-                'showticklabels': False,
-                'showline': False
-            },
-            'yaxis': {
-                'showgrid': False,
-                'zeroline': False,
-                'showticklabels': False,
-                'showline': False
-            },
-            'height': 800,
-            'width': 1000
-        }
-        
-        fig = {
-            'data': edge_traces + [node_trace],
-            'layout': layout
-        }
-        
+        # Build the graph off the event loop
+        with GRAPH_BUILD_SECONDS.labels("search_graph").time():
+            graph = await run_graph_task(build_search_graph, search_results, query.query_text)
+        if "graph_data" not in graph:
+            return graph
+
         return {
-            "graph_data": fig,
-            "node_count": len(G.nodes()),
-            "edge_count": len(G.edges()),
+            **graph,
             "query": query.query_text,
             "results": results
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/vector_graph")
-async def get_vector_graph():
+@router.api_route("/vector_graph", methods=["GET", "POST"])
+async def get_vector_graph(request: Request):
+    from backend.app.services.graph_builder import build_vector_graph, run_graph_task
     try:
-        # Get all papers and their vectors
-        points = qdrant.scroll(
-            collection_name=settings.VECTOR_DB_COLLECTION_NAME,
-            limit=100000,
-            with_payload=True,
-            with_vectors=True
-        )[0]
+        # Read the precomputed kNN graph maintained by the workers
+        snapshot = await asyncio.to_thread(knn_graph.snapshot)
         
-        if not points:
+        if not snapshot["ids"]:
             raise HTTPException(status_code=404, detail="No papers found")
+
+        # Let clients skip the download when the graph has not changed
+        etag = f'"{snapshot["version"]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        with GRAPH_BUILD_SECONDS.labels("vector_graph").time():
+            graph = await run_graph_task(build_vector_graph, snapshot)
+        return JSONResponse(
+            {**graph, "version": snapshot["version"]},
+            headers={"ETag": etag}
+        )
         
-        # Extract vectors and metadata
-        vectors = np.array([point.vector for point in points])
-        titles = [point.payload["title"] for point in points]
-        paper_ids = [point.id for point in points]
-        
-        # Find nearest neighbors
-        n_neighbors = min(5, len(vectors))  # Adjust number of connections
-        nn = NearestNeighbors(n_neighbors=n_neighbors)
-        nn.fit(vectors)
-        distances, indices = nn.kneighbors(vectors)
-        
-        # Create graph
-        G = nx.Graph()
-        
-        # Add nodes
-        for i, (title, paper_id) in enumerate(zip(titles, paper_ids)):
-            G.add_node(i, title=title, paper_id=paper_id)
-        
-        # Add edges
-        for i, neighbors in enumerate(indices):
-            for j, dist in zip(neighbors[1:], distances[i][1:]):  # Skip self-connection
-                G.add_edge(i, j, weight=1-dist)  # Convert distance to similarity
-        
-        # Get node positions using force-directed layout
-        pos = nx.spring_layout(G, k=1/np.sqrt(len(G.nodes())), iterations=50)
-        
-        # Create visualization data
-        edge_x = []
-        edge_y = []
-        for edge in G.edges():
-            x0, y0 = pos[edge[0]]
-            x1, y1 = pos[edge[1]]
-            edge_x.extend([x0, x1, None])
-            edge_y.extend([y0, y1, None])
-            
-        node_x = [pos[node][0] for node in G.nodes()]
-        node_y = [pos[node][1] for node in G.nodes()]
-        
-        # Create plot
-        edge_trace = {
-            'x': edge_x,
-            'y': edge_y,
-            'mode': 'lines',
-            'line': {'width': 0.5, 'color': '#888'},
-            'hoverinfo': 'none'
-        }
-        
-        node_trace = {
-            'x': node_x,
-            'y': node_y,
-            'mode': 'markers+text',
-            'marker': {
-                'size': 10,
-                'color': '#007bff'
-            },
-            'text': titles,
-            'hovertext': [f"Title: {title}<br>ID: {paper_id}" 
-                         for title, paper_id in zip(titles, paper_ids)],
-            'hoverinfo': 'text'
-        }
-        
-        layout = {
-            'showlegend': False,
-            'hovermode': 'closest',
-            'margin': {'b': 20, 'l': 5, 'r': 5, 't': 40},
-            'title': 'Paper Vector Relationship Graph',
-            'xaxis': {'showgrid': False, 'zeroline': False, 'showticklabels': False},
-            'yaxis': {'showgrid': False, 'zeroline': False, 'showticklabels': False}
-        }
-        
-        fig = {
-            'data': [edge_trace, node_trace],
-            'layout': layout
-        }
-        
-        return {
-            "graph_data": fig,
-            "node_count": len(G.nodes()),
-            "edge_count": len(G.edges())
-        }
-        
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/vector_graph/stream")
+async def stream_vector_graph(
+    cursor: int = QueryParam(0, ge=0),
+    # A page must make progress, or clients paging by cursor would never finish
+    limit: int = QueryParam(settings.GRAPH_STREAM_PAGE_SIZE, ge=1, le=settings.GRAPH_STREAM_MAX_PAGE_SIZE),
+    format: Literal["ndjson", "binary"] = "ndjson",
+    max_nodes: Optional[int] = QueryParam(None, ge=1),
+    version: Optional[int] = None
+):
+    """Stream one page of the vector graph as NDJSON records or binary columnar frames"""
+    from backend.app.services.graph_builder import vector_graph_positions, run_graph_task
+    from backend.app.services.graph_stream import iter_graph_stream
+    snapshot = await asyncio.to_thread(knn_graph.snapshot)
+    if not snapshot["ids"]:
+        raise HTTPException(status_code=404, detail="No papers found")
+    # Cursors are only meaningful against the version they were issued for
+    if version is not None and version != snapshot["version"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Graph changed to version {snapshot['version']}, restart from cursor 0"
+        )
+
+    with GRAPH_BUILD_SECONDS.labels("vector_graph_stream").time():
+        positions = await run_graph_task(vector_graph_positions, snapshot)
+    return StreamingResponse(
+        iter_graph_stream(
+            snapshot,
+            positions,
+            cursor=cursor,
+            limit=limit,
+            chunk_size=settings.GRAPH_STREAM_CHUNK_SIZE,
+            max_nodes=max_nodes,
+            fmt=format
+        ),
+        media_type="application/octet-stream" if format == "binary" else "application/x-ndjson",
+        headers={"ETag": f'"{snapshot["version"]}"'}
+    )
+
+@router.get("/cache_stats")
+async def get_cache_stats():
+    from backend.app.services.layout_service import layout_service
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "layout_cache": layout_service.stats(),
+        "query_cache": query_cache.stats(),
+        "status_table": status_table.stats()
+    }
+
+@router.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+async def _check_kafka():
+    # Metadata for the processing topic proves the brokers are reachable
+    metadata = await asyncio.to_thread(
+        services.producer.list_topics, settings.KAFKA_PROCESSING_TOPIC, settings.READINESS_TIMEOUT_SECONDS
+    )
+    topic = metadata.topics.get(settings.KAFKA_PROCESSING_TOPIC)
+    if topic is None or topic.error is not None:
+        raise RuntimeError(f"topic {settings.KAFKA_PROCESSING_TOPIC} unavailable: {topic.error if topic else 'missing'}")
+
+async def _check_qdrant():
+    await asyncio.wait_for(
+        services.qdrant.get_collection(settings.VECTOR_DB_COLLECTION_NAME),
+        settings.READINESS_TIMEOUT_SECONDS
+    )
+
+@router.get("/ready")
+async def ready():
+    """Readiness: Kafka and Qdrant answer, plus the state of the background loaders.
+
+    Returns 503 while a required dependency is unreachable.
+    """
+    checks = {"kafka": _check_kafka(), "qdrant": _check_qdrant()}
+    outcomes = await asyncio.gather(*checks.values(), return_exceptions=True)
+    dependencies = {
+        name: "ok" if outcome is None else f"error: {str(outcome) or type(outcome).__name__}"
+        for name, outcome in zip(checks, outcomes)
+    }
+    is_ready = all(state == "ok" for state in dependencies.values())
+    body = {
+        "status": "ready" if is_ready else "unavailable",
+        "dependencies": dependencies,
+        "dedup_index_loaded": dedup_index.ready,
+        "status_consumer": (
+            "disabled" if not settings.STATUS_TRACKING_ENABLED
+            else "running" if status_consumer.running else "stopped"
+        )
+    }
+    return JSONResponse(body, status_code=200 if is_ready else 503)
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
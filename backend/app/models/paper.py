@@ -1,8 +1,36 @@
 from pydantic import BaseModel
+from typing import List
+import re
+import uuid
+
+_DOI_PATTERN = re.compile(r'(10\.\d{4,9}/[^\s?#]+)')
 
 class Paper(BaseModel):
     title: str
     abstract: str
     authors: str
     published: str
-    link: str
\ No newline at end of file
+    link: str
+
+    def dedup_basis(self) -> str:
+        """Identity of the paper: its DOI if the link has one, else the link, else the normalized title"""
+        link = self.link.strip().lower()
+        doi = _DOI_PATTERN.search(link)
+        if doi:
+            return f"doi:{doi.group(1).rstrip('/.')}"
+        link = re.sub(r'^https?://(www\.)?', '', link).rstrip('/')
+        if link:
+            return f"link:{link}"
+        title = " ".join(re.sub(r'[^\w\s]', ' ', self.title.lower()).split())
+        return f"title:{title}"
+
+    def paper_id(self) -> str:
+        """Deterministic id, so resubmitting a paper maps to the same Qdrant point"""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, self.dedup_basis()))
+
+    def partition_key(self) -> bytes:
+        """Stable Kafka key so resubmissions of a paper land on the same partition"""
+        return self.paper_id().encode('utf-8')
+
+class PaperStatusRequest(BaseModel):
+    paper_ids: List[str]
@@ -1,5 +1,21 @@
 from pydantic import BaseModel
+from datetime import date
+from typing import List, Literal, Optional
+
+class SearchFilter(BaseModel):
+    """Metadata constraints applied inside the vector search"""
+    published_from: Optional[date] = None
+    published_to: Optional[date] = None
+    # A paper matches if any of its authors / its link host is listed
+    authors: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
 
 class Query(BaseModel):
     query_text: str
-    top_k: int = 2
\ No newline at end of file
+    top_k: int = 2
+    # "hybrid" fuses BM25 keyword matches with the vector results
+    mode: Literal["vector", "hybrid"] = "vector"
+    filter: Optional[SearchFilter] = None
+
+class QueryBatch(BaseModel):
+    queries: List[Query]
@@ -0,0 +1,82 @@
+import threading
+import httpx
+from confluent_kafka import Producer
+from qdrant_client import AsyncQdrantClient
+
+from backend.app.core.config import settings
+from backend.app.services.metrics import TimedQdrant
+
+class ServiceClients:
+    """The Kafka producer and Qdrant client shared by every API request.
+
+    Nothing is created at import time: each client is built on first use, so
+    the API starts (and reloads) without Kafka or Qdrant reachable, and the
+    lifespan closes whichever clients were opened. Assigning a client
+    replaces it, e.g. with an in-process stand-in.
+    """
+
+    def __init__(self):
+        self._producer = None
+        self._qdrant = None
+        self._lock = threading.Lock()
+
+    @property
+    def producer(self) -> Producer:
+        if self._producer is None:
+            with self._lock:
+                if self._producer is None:
+                    self._producer = Producer({
+                        'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS,
+                        'linger.ms': settings.KAFKA_PRODUCER_LINGER_MS,
+                        'batch.size': settings.KAFKA_PRODUCER_BATCH_BYTES,
+                        'compression.type': settings.KAFKA_PRODUCER_COMPRESSION
+                    })
+        return self._producer
+
+    @producer.setter
+    def producer(self, value):
+        self._producer = value
+
+    @property
+    def qdrant(self) -> AsyncQdrantClient:
+        if self._qdrant is None:
+            with self._lock:
+                if self._qdrant is None:
+                    # One async client with a keep-alive pool shared by every request, timed per call
+                    self._qdrant = TimedQdrant(AsyncQdrantClient(
+                        host=settings.QDRANT_HOST,
+                        port=settings.QDRANT_PORT,
+                        limits=httpx.Limits(
+                            max_connections=settings.QDRANT_MAX_CONNECTIONS,
+                            max_keepalive_connections=settings.QDRANT_MAX_CONNECTIONS
+                        )
+                    ))
+        return self._qdrant
+
+    @qdrant.setter
+    def qdrant(self, value):
+        self._qdrant = value
+
+    def opened(self) -> dict:
+        """Which clients have been created so far"""
+        return {"kafka": self._producer is not None, "qdrant": self._qdrant is not None}
+
+    async def aclose(self):
+        if self._producer is not None:
+            remaining = self._producer.flush(5)
+            if remaining:
+                print(f"{remaining} Kafka messages were not delivered before shutdown")
+            self._producer = None
+        if self._qdrant is not None:
+            await self._qdrant.close()
+            self._qdrant = None
+
+services = ServiceClients()
+
+def get_producer() -> Producer:
+    """FastAPI dependency for the shared Kafka producer"""
+    return services.producer
+
+def get_qdrant() -> AsyncQdrantClient:
+    """FastAPI dependency for the shared async Qdrant client"""
+    return services.qdrant
@@ -0,0 +1,132 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from urllib.parse import urlparse
+import re
+from qdrant_client.http import models
+
+from backend.app.core.config import settings
+
+def vectors_config(dim: Optional[int] = None) -> models.VectorParams:
+    """Vector parameters for the papers collection"""
+    return models.VectorParams(
+        size=dim or settings.EMBEDDING_DIM,
+        distance=models.Distance.COSINE,
+        # With quantization the originals are only read for rescoring, so they can live on disk
+        on_disk=settings.VECTOR_ON_DISK
+    )
+
+def quantization_config(kind: Optional[str] = None):
+    """Qdrant quantization config for VECTOR_QUANTIZATION ("none", "scalar" or "binary")"""
+    kind = kind or settings.VECTOR_QUANTIZATION
+    if kind == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+    if kind == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        )
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown VECTOR_QUANTIZATION: {kind}")
+
+def search_params(kind: Optional[str] = None) -> Optional[models.SearchParams]:
+    """Search with quantized vectors, then rescore the oversampled candidates at full precision"""
+    kind = kind or settings.VECTOR_QUANTIZATION
+    if kind == "none":
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=settings.QUANTIZATION_RESCORE,
+            oversampling=settings.QUANTIZATION_OVERSAMPLING
+        )
+    )
+
+# Payload fields that are indexed so filters are applied inside the HNSW search
+PAYLOAD_INDEXES = {
+    "authors": models.PayloadSchemaType.KEYWORD,
+    "source": models.PayloadSchemaType.KEYWORD,
+    "published_at": models.PayloadSchemaType.DATETIME,
+    "year": models.PayloadSchemaType.INTEGER
+}
+
+def create_payload_indexes(client, collection_name: str):
+    """Create the payload indexes; Qdrant ignores fields that are already indexed"""
+    for field_name, field_schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=field_schema
+        )
+
+_YEAR_PATTERN = re.compile(r'\b(1[89]\d{2}|2\d{3})\b')
+
+def normalize_published(value) -> Optional[datetime]:
+    """Parse the free-form published field into a UTC datetime (a bare year maps to January 1st)"""
+    value = str(value or "").strip()
+    if not value:
+        return None
+    try:
+        published = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        year = _YEAR_PATTERN.search(value)
+        if not year:
+            return None
+        published = datetime(int(year.group(1)), 1, 1)
+    if published.tzinfo is None:
+        return published.replace(tzinfo=timezone.utc)
+    return published.astimezone(timezone.utc)
+
+def link_source(link: str) -> str:
+    """Host the paper link points to (e.g. arxiv.org), used as its source/publisher"""
+    host = urlparse(link.strip() if "://" in link else f"//{link.strip()}").netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+def filter_payload(paper: dict) -> dict:
+    """Normalized, indexable payload fields derived from a paper"""
+    authors = paper.get("authors") or []
+    if isinstance(authors, str):
+        authors = authors.split(",")
+    published = normalize_published(paper.get("published"))
+    return {
+        "authors": [author.strip() for author in authors if author.strip()],
+        "source": link_source(paper.get("link") or ""),
+        "published_at": published.isoformat() if published else None,
+        "year": published.year if published else None
+    }
+
+def build_filter(search_filter) -> Optional[models.Filter]:
+    """Translate a SearchFilter into a Qdrant payload filter (None when nothing is set)"""
+    if search_filter is None:
+        return None
+    must = []
+    if search_filter.published_from or search_filter.published_to:
+        must.append(models.FieldCondition(
+            key="published_at",
+            range=models.DatetimeRange(
+                gte=_day_start(search_filter.published_from),
+                # The end date is inclusive
+                lt=_day_start(search_filter.published_to + timedelta(days=1))
+                if search_filter.published_to else None
+            )
+        ))
+    if search_filter.authors:
+        must.append(models.FieldCondition(
+            key="authors",
+            match=models.MatchAny(any=[author.strip() for author in search_filter.authors])
+        ))
+    if search_filter.sources:
+        must.append(models.FieldCondition(
+            key="source",
+            match=models.MatchAny(any=[link_source(source) for source in search_filter.sources])
+        ))
+    return models.Filter(must=must) if must else None
+
+def _day_start(day: Optional[date]) -> Optional[datetime]:
+    if day is None:
+        return None
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
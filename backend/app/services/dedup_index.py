@@ -0,0 +1,277 @@
+from contextlib import contextmanager
+from typing import Iterable, Optional
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from backend.app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+# magic, collection digest, bits, hashes, distinct ids added, loaded flag; padded so the bitmap is aligned
+_HEADER = struct.Struct("<4s16sQIQB")
+_HEADER_SIZE = 64
+_MAGIC = b"BLM1"
+
+class BloomFilter:
+    """Fixed-size bloom filter over string keys using double hashing.
+
+    The bits live in a bytearray, or in any writable buffer passed in (e.g. a
+    shared memory map).
+    """
+
+    def __init__(self, capacity: int, error_rate: float, bits=None):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray(self.num_bytes)
+
+    @property
+    def num_bytes(self) -> int:
+        return (self.num_bits + 7) // 8
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str) -> bool:
+        """Set the key's bits; True if any was unset, i.e. the key was certainly new"""
+        new = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                new = True
+        return new
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+class DedupIndex:
+    """Membership index of paper ids already stored in Qdrant.
+
+    With a path, the filter is a memory-mapped file shared by the API and
+    every worker process: ids one process adds are visible to the others
+    immediately, and only the first process to start scrolls the collection
+    to fill it. Adds take an flock so concurrent writers never lose a bit. A
+    file made for other parameters or another collection is replaced by a
+    new one, never truncated under processes that still map it; they switch
+    over on their next coverage check.
+
+    A negative answer from might_contain is definitive only while the filter
+    covers the collection; callers check `covers` against the collection's
+    point count and query Qdrant for every id when it does not. Until the
+    index has been loaded every id is reported as a possible duplicate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, path: Optional[str] = None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.path = path
+        self.bloom = None if path else BloomFilter(capacity, error_rate)
+        self._ready = False
+        self._size = 0
+        self._map = None
+        self._lock = threading.Lock()
+
+    # ----- shared file -----
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is not None and self._map is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None and self._map is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _header(self):
+        return _HEADER.unpack_from(self._map, 0)
+
+    def _layout(self):
+        probe = BloomFilter(self.capacity, self.error_rate, bits=b"")
+        digest = hashlib.blake2b(settings.VECTOR_DB_COLLECTION_NAME.encode("utf-8"), digest_size=16).digest()
+        return (_MAGIC, digest, probe.num_bits, probe.num_hashes), _HEADER_SIZE + probe.num_bytes
+
+    def _matches(self, fd, expected, size) -> bool:
+        header = os.pread(fd, _HEADER.size, 0)
+        return len(header) == _HEADER.size and _HEADER.unpack(header)[:4] == expected \
+            and os.fstat(fd).st_size == size
+
+    def _create(self, expected, size):
+        """Write an empty filter to a temp file and rename it over the shared path"""
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".bin")
+        try:
+            os.fchmod(fd, 0o666)
+            os.ftruncate(fd, size)
+            os.pwrite(fd, _HEADER.pack(*expected, 0, 0), 0)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, self.path)
+
+    def _open(self):
+        """Map the shared file, replacing it first if it was made for other parameters or another collection"""
+        if not self.path or self._map is not None:
+            return
+        with self._lock:
+            if self._map is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            expected, size = self._layout()
+            # Creation and replacement are serialized on a lock file, which is never replaced itself
+            with open(self.path + ".lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    try:
+                        fd = os.open(self.path, os.O_RDWR)
+                    except FileNotFoundError:
+                        fd = None
+                    if fd is None or not self._matches(fd, expected, size):
+                        if fd is not None:
+                            os.close(fd)
+                        self._create(expected, size)
+                        fd = os.open(self.path, os.O_RDWR)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._fd = fd
+            self._map = mmap.mmap(fd, size)
+            self.bloom = BloomFilter(
+                self.capacity, self.error_rate, bits=memoryview(self._map)[_HEADER_SIZE:]
+            )
+
+    def _replaced(self) -> bool:
+        """Whether another process has swapped a new file in at the shared path"""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _reopen(self):
+        """Drop the mapping of a replaced file and map the current one.
+
+        The old mapping is left to be garbage collected rather than closed,
+        since its bitmap view may still be referenced.
+        """
+        with self._lock:
+            os.close(self._fd)
+            self._map = None
+            self.bloom = None
+        self._open()
+
+    def _set_header(self, added: int = 0, loaded: bool = False):
+        magic, digest, num_bits, num_hashes, count, flag = self._header()
+        _HEADER.pack_into(self._map, 0, magic, digest, num_bits, num_hashes, count + added, flag or loaded)
+
+    # ----- membership -----
+
+    @property
+    def ready(self) -> bool:
+        if self._map is not None:
+            return bool(self._header()[5])
+        return self._ready
+
+    @property
+    def size(self) -> int:
+        """Distinct ids added so far (a false-positive add is not counted)"""
+        if self._map is not None:
+            return self._header()[4]
+        return self._size
+
+    def covers(self, points_count: Optional[int]) -> bool:
+        """Whether negatives can be trusted for a collection holding points_count points.
+
+        Every stored point is added once it is upserted, so fewer distinct ids
+        than points (beyond the adds lost to false positives) means some were
+        written without passing through this filter.
+        """
+        self._open()
+        if self._map is not None and self._replaced():
+            self._reopen()
+        if not self.ready:
+            return False
+        if points_count is None:
+            return True
+        return self.size + math.ceil(2 * self.error_rate * points_count) >= points_count
+
+    def might_contain(self, paper_id: str) -> bool:
+        self._open()
+        if not self.ready:
+            return True
+        return str(paper_id) in self.bloom
+
+    def add(self, paper_ids: Iterable[str]):
+        self._open()
+        with self._locked():
+            added = 0
+            for paper_id in paper_ids:
+                added += self.bloom.add(str(paper_id))
+            if self._map is not None:
+                self._set_header(added=added)
+            else:
+                self._size += added
+
+    def _mark_loaded(self):
+        if self._map is not None:
+            with self._locked():
+                self._set_header(loaded=True)
+        self._ready = True
+
+    def load(self, qdrant, page_size: int = 10000, force: bool = False):
+        """Populate from every point id in the collection (ids only, no payload or vectors).
+
+        A shared filter another process has already loaded is used as is,
+        unless force is set. Ids already present are not counted again.
+        """
+        self._open()
+        if self.ready and not force:
+            return
+        offset = None
+        while True:
+            page, offset = qdrant.scroll(
+                collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                limit=page_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            self.add(point.id for point in page)
+            if offset is None:
+                break
+        self._mark_loaded()
+
+    async def aload(self, qdrant, page_size: int = 10000):
+        """Async variant of load for the API's AsyncQdrantClient"""
+        self._open()
+        if self.ready:
+            return
+        offset = None
+        while True:
+            page, offset = await qdrant.scroll(
+                collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                limit=page_size,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            self.add(point.id for point in page)
+            if offset is None:
+                break
+        self._mark_loaded()
+
+def new_dedup_index() -> DedupIndex:
+    return DedupIndex(settings.DEDUP_BLOOM_CAPACITY, settings.DEDUP_BLOOM_ERROR_RATE, settings.DEDUP_BLOOM_PATH)
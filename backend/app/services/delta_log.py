@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional, Tuple
+import io
+import os
+import struct
+import tempfile
+import numpy as np
+
+_HEADER = struct.Struct("<4sq")  # magic, generation of the base file the records apply to
+_LENGTH = struct.Struct("<Q")
+_MAGIC = b"NPZL"
+
+def pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode strings as (int64 offsets, uint8 UTF-8 blob) instead of fixed-width UCS-4"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+def unpack_strings(offsets: np.ndarray, blob: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+class DeltaLog:
+    """Append-only log of small .npz records written next to a base snapshot file.
+
+    Writers append one record per batch instead of rewriting the base, and
+    compact by writing a new base with the next generation and resetting the
+    log. The header names the generation the records belong to, so a reader
+    holding an older (or newer) base ignores the log until it has reloaded.
+    Records are length-prefixed; a trailing partial record (a writer still
+    appending, or one that crashed) is left unread and truncated by the next
+    writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def size(self) -> int:
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def reset(self, generation: int) -> int:
+        """Start an empty log for a freshly written base; returns the first record offset"""
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".delta")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, generation))
+        os.replace(tmp_path, self.path)
+        return _HEADER.size
+
+    def read(self, generation: int, offset: Optional[int]) -> Tuple[List[Dict[str, np.ndarray]], Optional[int]]:
+        """Records after offset and the offset to resume from (None if the log is for another generation)"""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return [], None
+        with f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size or _HEADER.unpack(header) != (_MAGIC, generation):
+                return [], None
+            start = max(offset or 0, _HEADER.size)
+            f.seek(start)
+            data = f.read()
+
+        records = []
+        position = 0
+        while position + _LENGTH.size <= len(data):
+            (length,) = _LENGTH.unpack_from(data, position)
+            end = position + _LENGTH.size + length
+            if end > len(data):
+                break
+            with np.load(io.BytesIO(data[position + _LENGTH.size:end]), allow_pickle=False) as record:
+                records.append({name: record[name] for name in record.files})
+            position = end
+        return records, start + position
+
+    def append(self, generation: int, offset: Optional[int], **arrays) -> int:
+        """Append one record after the last complete one (callers hold the writer lock)"""
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        payload = buffer.getvalue()
+        if offset is None:
+            offset = self.reset(generation)
+        with open(self.path, "r+b") as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(_LENGTH.pack(len(payload)) + payload)
+        return offset + _LENGTH.size + len(payload)
@@ -0,0 +1,162 @@
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from backend.app.core.config import settings
+
+class EmbeddingCache:
+    """Two-tier embedding cache: an in-process LRU in front of a SQLite file.
+
+    Entries are content-addressed by (model, dimension, hash of normalized text),
+    so the API and the worker processes can share the same database file.
+    """
+
+    def __init__(self, path: str, memory_entries: int, max_entries: int):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._writes_since_evict = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize unicode and whitespace so trivially different inputs share a key"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def make_key(cls, text: str, model: str, dim: int) -> str:
+        digest = hashlib.sha256(cls.normalize(text).encode("utf-8")).hexdigest()
+        return f"{model}:{dim}:{digest}"
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not be shared across forked worker processes
+        if self._conn is None or self._conn_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings (accessed_at)"
+            )
+            conn.commit()
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for whichever keys are present"""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            if missing:
+                try:
+                    conn = self._connection()
+                    placeholders = ",".join("?" * len(missing))
+                    rows = conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        missing
+                    ).fetchall()
+                    if rows:
+                        conn.executemany(
+                            "UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                            [(time.time(), key) for key, _ in rows]
+                        )
+                        conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Embedding cache read failed: {str(e)}")
+                    rows = []
+
+                for key, blob in rows:
+                    vector = array("f", blob).tolist()
+                    self._remember(key, vector)
+                    found[key] = vector
+                self.disk_hits += len(rows)
+                self.misses += len(missing) - len(rows)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Store vectors in both tiers, evicting the least recently used rows past max_entries"""
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, list(vector))
+            try:
+                conn = self._connection()
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, accessed_at) VALUES (?, ?, ?)",
+                    [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+                )
+                self._writes_since_evict += len(items)
+                if self._writes_since_evict >= 1000:
+                    self._evict(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache write failed: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        self._writes_since_evict = 0
+        count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self.get_many([key]).get(key)
+
+    def put(self, key: str, vector: List[float]):
+        self.put_many({key: vector})
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+embedding_cache = EmbeddingCache(
+    path=settings.EMBEDDING_CACHE_PATH,
+    memory_entries=settings.EMBEDDING_CACHE_MEMORY_ENTRIES,
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+)
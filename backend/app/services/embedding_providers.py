@@ -0,0 +1,172 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List
+import asyncio
+import hashlib
+import threading
+import numpy as np
+
+from backend.app.core.config import settings
+from backend.app.services.rate_limiter import rate_limiter, estimate_tokens
+
+class EmbeddingProvider(ABC):
+    """Turns a batch of texts into vectors of settings.EMBEDDING_DIM floats"""
+
+    name = "base"
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed, texts)
+
+    async def aclose(self):
+        pass
+
+class OpenAIProvider(EmbeddingProvider):
+    """Remote embeddings through the OpenAI API, paced by the shared rate limiter"""
+
+    name = "openai"
+
+    def __init__(self, model: str):
+        # The OpenAI client (and aiohttp) load with the first provider, not at API startup
+        import openai
+
+        self.model = model
+        self._aiosession = None
+        openai.api_key = settings.OPENAI_API_KEY
+
+    def _params(self):
+        # text-embedding-3 models are Matryoshka-trained and can return shortened vectors
+        if self.model.startswith("text-embedding-3"):
+            return {"dimensions": settings.EMBEDDING_DIM}
+        return {}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        import openai
+
+        if settings.EMBEDDING_RATE_LIMIT_ENABLED:
+            rate_limiter.acquire(sum(estimate_tokens(text) for text in texts))
+        try:
+            response = openai.Embedding.create(model=self.model, input=texts, **self._params())
+        except openai.error.RateLimitError:
+            if settings.EMBEDDING_RATE_LIMIT_ENABLED:
+                rate_limiter.on_rate_limited()
+            raise
+        if settings.EMBEDDING_RATE_LIMIT_ENABLED:
+            rate_limiter.on_success()
+        # The API may return items out of order, so realign by index
+        data = sorted(response['data'], key=lambda item: item['index'])
+        return [item['embedding'] for item in data]
+
+    def _session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+
+        # Reuse one pooled session instead of a new connection per request
+        if self._aiosession is None or self._aiosession.closed:
+            self._aiosession = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=settings.OPENAI_MAX_CONNECTIONS)
+            )
+        return self._aiosession
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        import openai
+
+        if settings.EMBEDDING_RATE_LIMIT_ENABLED:
+            await rate_limiter.aacquire(sum(estimate_tokens(text) for text in texts))
+        openai.aiosession.set(self._session())
+        try:
+            response = await openai.Embedding.acreate(model=self.model, input=texts, **self._params())
+        except openai.error.RateLimitError:
+            if settings.EMBEDDING_RATE_LIMIT_ENABLED:
+                rate_limiter.on_rate_limited()
+            raise
+        if settings.EMBEDDING_RATE_LIMIT_ENABLED:
+            rate_limiter.on_success()
+        data = sorted(response['data'], key=lambda item: item['index'])
+        return [item['embedding'] for item in data]
+
+    async def aclose(self):
+        if self._aiosession is not None and not self._aiosession.closed:
+            await self._aiosession.close()
+        self._aiosession = None
+
+class LocalProvider(EmbeddingProvider):
+    """CPU inference with a sentence-transformers model loaded once per process.
+
+    Inputs are encoded in batches of EMBEDDING_BATCH_SIZE on a single
+    dedicated thread, so concurrent requests queue instead of oversubscribing
+    the cores. Vectors longer than EMBEDDING_DIM are truncated and
+    renormalized (Matryoshka-style).
+    """
+
+    name = "local"
+
+    def __init__(self, model: str):
+        self.model_name = model
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError:
+                    raise RuntimeError(
+                        "Local embeddings need the sentence-transformers package"
+                    )
+                if settings.EMBEDDING_THREADS > 0:
+                    import torch
+                    torch.set_num_threads(settings.EMBEDDING_THREADS)
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._load().encode(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        if vectors.shape[1] < settings.EMBEDDING_DIM:
+            raise ValueError(
+                f"Model {self.model_name} produces {vectors.shape[1]} dimensions, "
+                f"EMBEDDING_DIM is {settings.EMBEDDING_DIM}"
+            )
+        vectors = vectors[:, :settings.EMBEDDING_DIM]
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+        return vectors.tolist()
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed, texts)
+
+class FakeProvider(EmbeddingProvider):
+    """Deterministic pseudo-random unit vectors for benchmarks and offline runs"""
+
+    name = "fake"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = np.empty((len(texts), settings.EMBEDDING_DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vectors[i] = np.random.default_rng(seed).standard_normal(settings.EMBEDDING_DIM)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors.tolist()
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts)
+
+@lru_cache()
+def get_provider() -> EmbeddingProvider:
+    """Pick the provider from EMBEDDING_MODEL: "fake", "local:<model>", or an OpenAI model name"""
+    model = settings.EMBEDDING_MODEL
+    if model == "fake" or model.startswith("fake:"):
+        return FakeProvider()
+    if model.startswith("local:"):
+        return LocalProvider(model[len("local:"):])
+    return OpenAIProvider(model)
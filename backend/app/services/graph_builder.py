@@ -0,0 +1,237 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import numpy as np
+
+from backend.app.core.config import settings
+from backend.app.services.layout_service import layout_service
+from backend.app.services.metrics import CACHE_REQUESTS, LAYOUT_SECONDS
+
+# Bounded pool for CPU-heavy graph work so it never runs on the event loop
+graph_executor = ThreadPoolExecutor(
+    max_workers=settings.GRAPH_EXECUTOR_WORKERS,
+    thread_name_prefix="graph"
+)
+
+# Similarity bands used to style weighted edges (one Plotly trace per band)
+_WEIGHT_BANDS = 10
+
+async def run_graph_task(func, *args):
+    """Run a CPU-bound graph builder on the bounded executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(graph_executor, func, *args)
+
+def similarity_edges(vectors, k, min_similarity):
+    """Undirected top-k cosine similarity edges as (src, dst, weights) arrays.
+
+    One matrix multiply gives every pairwise cosine similarity; each node keeps
+    its k most similar neighbours above min_similarity, and mutual pairs are
+    deduplicated.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    k = min(k, n - 1)
+    if k < 1:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+    similarities = vectors @ vectors.T
+    np.fill_diagonal(similarities, -np.inf)
+
+    neighbors = np.argpartition(similarities, -k, axis=1)[:, -k:]
+    src = np.repeat(np.arange(n, dtype=np.int32), k)
+    dst = neighbors.ravel().astype(np.int32)
+    weights = similarities[src, dst]
+    keep = weights > min_similarity
+    src, dst, weights = src[keep], dst[keep], weights[keep]
+
+    lo = np.minimum(src, dst)
+    hi = np.maximum(src, dst)
+    _, unique = np.unique(lo.astype(np.int64) * n + hi, return_index=True)
+    return lo[unique], hi[unique], weights[unique]
+
+def _layout(kind, key, paper_ids, src, dst, weights, iterations):
+    """Lay out nodes 0..n-1 through the shared layout cache"""
+    positions, layout_ms, method = layout_service.layout(
+        kind,
+        key,
+        [str(paper_id) for paper_id in paper_ids],
+        src,
+        dst,
+        weights,
+        iterations=iterations
+    )
+    LAYOUT_SECONDS.labels(kind, method).observe(layout_ms / 1000)
+    CACHE_REQUESTS.labels("layout", "hit" if method == "cached" else "miss").inc()
+    return positions, {"layout_ms": round(layout_ms, 2), "layout_method": method}
+
+def _segments(positions, src, dst, axis):
+    """Plotly line coordinates for all edges: x0, x1, None per edge"""
+    coords = np.empty((len(src), 3), dtype=object)
+    coords[:, 0] = positions[src, axis]
+    coords[:, 1] = positions[dst, axis]
+    coords[:, 2] = None
+    return coords.ravel().tolist()
+
+def _edge_traces(positions, src, dst, weights, weighted):
+    """Edge traces; weighted graphs get one trace per similarity band so width and opacity track the weight"""
+    if not weighted:
+        return [{
+            'x': _segments(positions, src, dst, 0),
+            'y': _segments(positions, src, dst, 1),
+            'mode': 'lines',
+            'line': {'width': 0.5, 'color': '#888'},
+            'hoverinfo': 'none'
+        }]
+
+    traces = []
+    bands = np.minimum((weights * _WEIGHT_BANDS).astype(np.int64), _WEIGHT_BANDS - 1)
+    for band in np.unique(bands):
+        mask = bands == band
+        weight = round((band + 0.5) / _WEIGHT_BANDS, 3)
+        traces.append({
+            'x': _segments(positions, src[mask], dst[mask], 0),
+            'y': _segments(positions, src[mask], dst[mask], 1),
+            'mode': 'lines',
+            'line': {
+                'width': weight * 3,
+                'color': f'rgba(70, 130, 180, {weight})'
+            },
+            'hoverinfo': 'none'
+        })
+    return traces
+
+def build_graph(paper_ids, titles, src, dst, weights, positions, layout, weighted=False):
+    """Plotly figure for a graph given as edge arrays over nodes 0..n-1 and their positions"""
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float32)
+    degree = np.bincount(np.concatenate([src, dst]), minlength=len(paper_ids))
+
+    node_trace = {
+        'x': positions[:, 0].tolist(),
+        'y': positions[:, 1].tolist(),
+        'mode': 'markers+text',
+        'text': titles,
+        'hoverinfo': 'text'
+    }
+    if weighted:
+        # Node size grows with the number of connections
+        node_trace['marker'] = {
+            'size': (10 + 5 * degree).tolist(),
+            'color': '#1f77b4',
+            'line': {'width': 1, 'color': 'white'},
+            'opacity': 0.8
+        }
+        node_trace['textposition'] = 'top center'
+        node_trace['textfont'] = {'size': 10, 'color': '#666'}
+        node_trace['hovertext'] = [
+            f"Title: {title}<br>ID: {paper_id}<br>Connections: {connections}"
+            for title, paper_id, connections in zip(titles, paper_ids, degree.tolist())
+        ]
+    else:
+        node_trace['marker'] = {'size': 10, 'color': '#007bff'}
+        node_trace['hovertext'] = [
+            f"Title: {title}<br>ID: {paper_id}" for title, paper_id in zip(titles, paper_ids)
+        ]
+
+    fig = {
+        'data': _edge_traces(positions, src, dst, weights, weighted) + [node_trace],
+        'layout': layout
+    }
+    return {
+        "graph_data": fig,
+        "node_count": len(paper_ids),
+        "edge_count": len(src)
+    }
+
+def build_search_graph(search_results, query_text):
+    """Build the Plotly similarity network for a list of scored points"""
+    titles = [result.payload["title"][:50] + "..." if len(result.payload["title"]) > 50
+             else result.payload["title"] for result in search_results]
+    paper_ids = [str(result.id) for result in search_results]
+
+    if len(search_results) < 2:
+        # If we have too few results, return simple data without graph
+        return {
+            "message": "Not enough results for graph visualization",
+            "results": [{"title": title, "id": paper_id}
+                       for title, paper_id in zip(titles, paper_ids)]
+        }
+
+    src, dst, weights = similarity_edges(
+        [result.vector for result in search_results],
+        settings.SEARCH_GRAPH_NEIGHBORS,
+        settings.SEARCH_GRAPH_MIN_SIMILARITY
+    )
+
+    # Get positions (cached per result set, warm-started from the previous search)
+    positions, layout_info = _layout(
+        "search", tuple(paper_ids), paper_ids, src, dst, weights, iterations=100
+    )
+
+    layout = {
+        'showlegend': False,
+        'hovermode': 'closest',
+        'margin': {'b': 40, 'l': 40, 'r': 40, 't': 40},
+        'title': {
+            'text': f'Paper Similarity Network for "{query_text}"',
+            'font': {'size': 24, 'color': '#333'}
+        },
+        'plot_bgcolor': '#fff',
+        'paper_bgcolor': '#fff',
+        'xaxis': {
+            'showgrid': False,
+            'zeroline': False,
+            'showticklabels': False,
+            'showline': False
+        },
+        'yaxis': {
+            'showgrid': False,
+            'zeroline': False,
+            'showticklabels': False,
+            'showline': False
+        },
+        'height': 800,
+        'width': 1000
+    }
+
+    graph = build_graph(paper_ids, titles, src, dst, weights, positions, layout, weighted=True)
+    return {**graph, **layout_info}
+
+def vector_graph_positions(snapshot):
+    """Node positions for a kNN graph snapshot, shared with build_vector_graph through the layout cache"""
+    positions, _, _ = layout_service.layout(
+        "vector",
+        snapshot["version"],
+        snapshot["ids"],
+        snapshot["src"],
+        snapshot["dst"],
+        snapshot["weights"],
+        iterations=50
+    )
+    return positions
+
+def build_vector_graph(snapshot):
+    """Build the Plotly network from a precomputed kNN graph snapshot"""
+    # Get node positions, cached per graph version
+    positions, layout_info = _layout(
+        "vector", snapshot["version"], snapshot["ids"],
+        snapshot["src"], snapshot["dst"], snapshot["weights"], iterations=50
+    )
+
+    layout = {
+        'showlegend': False,
+        'hovermode': 'closest',
+        'margin': {'b': 20, 'l': 5, 'r': 5, 't': 40},
+        'title': 'Paper Vector Relationship Graph',
+        'xaxis': {'showgrid': False, 'zeroline': False, 'showticklabels': False},
+        'yaxis': {'showgrid': False, 'zeroline': False, 'showticklabels': False}
+    }
+
+    graph = build_graph(
+        snapshot["ids"], snapshot["titles"],
+        snapshot["src"], snapshot["dst"], snapshot["weights"],
+        positions, layout
+    )
+    return {**graph, **layout_info}
@@ -0,0 +1,86 @@
+from typing import Iterator, Optional
+import json
+import struct
+import numpy as np
+
+def sample_nodes(snapshot, max_nodes: Optional[int]) -> np.ndarray:
+    """Pick the node indices to emit; above max_nodes keep the best-connected ones"""
+    n = len(snapshot["ids"])
+    if not max_nodes or max_nodes >= n:
+        return np.arange(n)
+    degree = np.bincount(snapshot["src"], minlength=n) + np.bincount(snapshot["dst"], minlength=n)
+    keep = np.argpartition(-degree, max_nodes - 1)[:max_nodes]
+    return np.sort(keep)
+
+def _encode_ndjson(header, arrays) -> bytes:
+    record = dict(header)
+    for name, values in arrays.items():
+        record[name] = values.tolist()
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+def _encode_binary(header, arrays) -> bytes:
+    """Frame = uint32 header length, JSON header, then the raw little-endian arrays in order"""
+    header = dict(header)
+    header["arrays"] = [[name, values.dtype.str, len(values)] for name, values in arrays.items()]
+    header_bytes = json.dumps(header).encode("utf-8")
+    body = b"".join(np.ascontiguousarray(values).tobytes() for values in arrays.values())
+    return struct.pack("<I", len(header_bytes)) + header_bytes + body
+
+def iter_graph_stream(snapshot, positions, cursor: int, limit: int, chunk_size: int,
+                      max_nodes: Optional[int] = None, fmt: str = "ndjson") -> Iterator[bytes]:
+    """Yield one page of the vector graph as a sequence of node and edge chunks.
+
+    Nodes are paged by position in the (optionally sampled) node order and
+    each edge is emitted with the page that holds its lower endpoint, so
+    walking every cursor returns every edge exactly once.
+    """
+    encode = _encode_binary if fmt == "binary" else _encode_ndjson
+    nodes = sample_nodes(snapshot, max_nodes)
+    total = len(nodes)
+
+    # Remap edges onto the sampled order, dropping any edge with a missing endpoint
+    remap = np.full(len(snapshot["ids"]), -1, dtype=np.int64)
+    remap[nodes] = np.arange(total)
+    src = remap[snapshot["src"]]
+    dst = remap[snapshot["dst"]]
+    keep = (src >= 0) & (dst >= 0)
+    src, dst, weights = src[keep], dst[keep], snapshot["weights"][keep]
+    order = np.argsort(src, kind="stable")
+    src, dst, weights = src[order], dst[order], weights[order]
+
+    start = max(0, min(cursor, total))
+    end = min(total, start + limit)
+    next_cursor = end if end < total else None
+
+    yield encode({
+        "type": "header",
+        "version": snapshot["version"],
+        "node_count": total,
+        "edge_count": int(len(src)),
+        "sampled": total < len(snapshot["ids"]),
+        "cursor": start,
+        "next_cursor": next_cursor
+    }, {})
+
+    for chunk_start in range(start, end, chunk_size):
+        chunk_end = min(end, chunk_start + chunk_size)
+        original = nodes[chunk_start:chunk_end]
+        yield encode({
+            "type": "nodes",
+            "offset": chunk_start,
+            "ids": [snapshot["ids"][i] for i in original],
+            "titles": [snapshot["titles"][i] for i in original]
+        }, {
+            "x": positions[original, 0].astype(np.float32),
+            "y": positions[original, 1].astype(np.float32)
+        })
+
+        lo, hi = np.searchsorted(src, [chunk_start, chunk_end])
+        if hi > lo:
+            yield encode({"type": "edges"}, {
+                "src": src[lo:hi].astype(np.int32),
+                "dst": dst[lo:hi].astype(np.int32),
+                "weight": weights[lo:hi].astype(np.float32)
+            })
+
+    yield encode({"type": "end", "next_cursor": next_cursor}, {})
@@ -0,0 +1,378 @@
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+import os
+import tempfile
+import threading
+import numpy as np
+from qdrant_client.http import models
+
+from backend.app.core.config import settings
+from backend.app.services.collection_config import search_params
+from backend.app.services.delta_log import DeltaLog, pack_strings, unpack_strings
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+class KnnGraphIndex:
+    """Precomputed k-nearest-neighbour graph over the papers collection.
+
+    Each node keeps its top-k most similar papers. The graph is persisted as
+    a CSR base file (.npz, ids and titles as UTF-8 blobs) plus a delta log:
+    each worker batch appends only the nodes it added or changed, and the
+    base is rewritten once the log outgrows KNN_GRAPH_COMPACT_RATIO of it.
+    In memory, rows changed since the base are kept as overrides. The API
+    reloads the base only when it is replaced and applies new log records
+    in between.
+    """
+
+    def __init__(self, path: str, k: int, compact_ratio: float):
+        self.path = path
+        self.k = k
+        self.compact_ratio = compact_ratio
+        self.version = 0
+        self.generation = 0
+        self.ids: List[str] = []
+        self.titles: List[str] = []
+        self.id_to_index: Dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._rows: Dict[int, List[Tuple[int, float]]] = {}
+        self._touched = set()
+        self._retitled = set()
+        self._delta = DeltaLog(path + ".delta")
+        self._delta_offset = None
+        self._base_stat = None
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ----- persistence -----
+
+    @contextmanager
+    def _locked(self):
+        """Serialize writers across worker processes with an advisory file lock"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def to_csr(self):
+        """Return (indptr, indices, weights) for the base merged with the changed rows"""
+        n = len(self.ids)
+        base_n = len(self._indptr) - 1
+        base_counts = np.diff(self._indptr)
+        counts = np.zeros(n, dtype=np.int64)
+        counts[:base_n] = base_counts
+        for node, row in self._rows.items():
+            counts[node] = len(row)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.empty(int(indptr[-1]), dtype=np.int32)
+        weights = np.empty(int(indptr[-1]), dtype=np.float32)
+
+        # Copy the unchanged base rows in one vectorized pass
+        keep = np.ones(base_n, dtype=bool)
+        keep[[node for node in self._rows if node < base_n]] = False
+        rows = np.repeat(np.arange(base_n), base_counts)
+        kept = keep[rows]
+        positions = indptr[rows[kept]] + (np.arange(len(rows))[kept] - self._indptr[rows[kept]])
+        indices[positions] = self._indices[kept]
+        weights[positions] = self._weights[kept]
+
+        for node, row in self._rows.items():
+            start = indptr[node]
+            for offset, (j, w) in enumerate(row):
+                indices[start + offset] = j
+                weights[start + offset] = w
+        return indptr, indices, weights
+
+    def _compact(self):
+        """Fold the changed rows into a new base file and start an empty delta log"""
+        indptr, indices, weights = self.to_csr()
+        id_offsets, id_blob = pack_strings(self.ids)
+        title_offsets, title_blob = pack_strings(self.titles)
+        self.generation += 1
+        directory = os.path.dirname(self.path) or "."
+        # Write to a temp file and rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                version=np.int64(self.version),
+                generation=np.int64(self.generation),
+                k=np.int32(self.k),
+                id_offsets=id_offsets,
+                id_blob=id_blob,
+                title_offsets=title_offsets,
+                title_blob=title_blob,
+                indptr=indptr,
+                indices=indices,
+                weights=weights
+            )
+        os.replace(tmp_path, self.path)
+        self._delta_offset = self._delta.reset(self.generation)
+        self._indptr, self._indices, self._weights = indptr, indices, weights
+        self._rows = {}
+        stat = os.stat(self.path)
+        self._base_stat = (stat.st_ino, stat.st_mtime_ns)
+
+    def _delta_record(self, first_new: int) -> dict:
+        """The nodes added or changed by the current write, as log record arrays"""
+        id_offsets, id_blob = pack_strings(self.ids[first_new:])
+        title_nodes = sorted(self._retitled | set(range(first_new, len(self.ids))))
+        title_offsets, title_blob = pack_strings([self.titles[node] for node in title_nodes])
+        nodes = sorted(self._touched)
+        rows = [self._rows[node] for node in nodes]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in rows], out=indptr[1:])
+        return {
+            "version": np.int64(self.version),
+            "first_node": np.int64(first_new),
+            "id_offsets": id_offsets,
+            "id_blob": id_blob,
+            "title_nodes": np.array(title_nodes, dtype=np.int32),
+            "title_offsets": title_offsets,
+            "title_blob": title_blob,
+            "nodes": np.array(nodes, dtype=np.int32),
+            "indptr": indptr,
+            "indices": np.array([j for row in rows for j, _ in row], dtype=np.int32),
+            "weights": np.array([w for row in rows for _, w in row], dtype=np.float32)
+        }
+
+    def _apply(self, record):
+        first_new = int(record["first_node"])
+        for node, paper_id in enumerate(unpack_strings(record["id_offsets"], record["id_blob"]), start=first_new):
+            if node == len(self.ids):
+                self.ids.append(paper_id)
+                self.titles.append("")
+                self.id_to_index[paper_id] = node
+        titles = unpack_strings(record["title_offsets"], record["title_blob"])
+        for node, title in zip(record["title_nodes"].tolist(), titles):
+            self.titles[node] = title
+        indptr = record["indptr"].tolist()
+        indices = record["indices"].tolist()
+        weights = record["weights"].tolist()
+        for i, node in enumerate(record["nodes"].tolist()):
+            self._rows[node] = list(zip(indices[indptr[i]:indptr[i + 1]], weights[indptr[i]:indptr[i + 1]]))
+        self.version = int(record["version"])
+
+    def load(self):
+        stat = os.stat(self.path)
+        with np.load(self.path, allow_pickle=False) as data:
+            self.version = int(data["version"])
+            self.generation = int(data["generation"]) if "generation" in data.files else 0
+            if "id_blob" in data.files:
+                self.ids = unpack_strings(data["id_offsets"], data["id_blob"])
+                self.titles = unpack_strings(data["title_offsets"], data["title_blob"])
+            else:
+                # Files written before the delta log stored fixed-width string arrays
+                self.ids = data["ids"].tolist()
+                self.titles = data["titles"].tolist()
+            self._indptr = data["indptr"]
+            self._indices = data["indices"]
+            self._weights = data["weights"]
+        self.id_to_index = {paper_id: i for i, paper_id in enumerate(self.ids)}
+        self._rows = {}
+        self._delta_offset = None
+        self._base_stat = (stat.st_ino, stat.st_mtime_ns)
+
+    def refresh(self) -> bool:
+        """Reload the base if another process replaced it, then apply new delta records"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        changed = False
+        if (stat.st_ino, stat.st_mtime_ns) != self._base_stat:
+            self.load()
+            changed = True
+        records, offset = self._delta.read(self.generation, self._delta_offset)
+        for record in records:
+            self._apply(record)
+        if offset is not None:
+            self._delta_offset = offset
+        return changed or bool(records)
+
+    # ----- incremental updates -----
+
+    def _node(self, paper_id: str, title: str) -> int:
+        index = self.id_to_index.get(paper_id)
+        if index is None:
+            index = len(self.ids)
+            self.ids.append(paper_id)
+            self.titles.append(title)
+            self.id_to_index[paper_id] = index
+            self._set_row(index, [])
+        elif title and title != self.titles[index]:
+            self.titles[index] = title
+            self._retitled.add(index)
+        return index
+
+    def _row(self, node: int) -> List[Tuple[int, float]]:
+        row = self._rows.get(node)
+        if row is not None:
+            return row
+        if node < len(self._indptr) - 1:
+            start, end = self._indptr[node], self._indptr[node + 1]
+            return list(zip(self._indices[start:end].tolist(), self._weights[start:end].tolist()))
+        return []
+
+    def _set_row(self, node: int, row: List[Tuple[int, float]]):
+        self._rows[node] = row
+        self._touched.add(node)
+
+    def _offer(self, node: int, other: int, score: float):
+        """Insert other into node's neighbour list if it ranks in the top k"""
+        neighbors = [(j, w) for j, w in self._row(node) if j != other]
+        neighbors.append((other, score))
+        neighbors.sort(key=lambda item: item[1], reverse=True)
+        self._set_row(node, neighbors[:self.k])
+
+    def _persist(self, first_new: int):
+        """Append this write to the delta log, or compact once the log has outgrown the base"""
+        try:
+            base_size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            base_size = 0
+        if not base_size or self._delta.size() > max(base_size * self.compact_ratio, 1 << 20):
+            self._compact()
+        else:
+            self._delta_offset = self._delta.append(
+                self.generation, self._delta_offset, **self._delta_record(first_new)
+            )
+        self._touched = set()
+        self._retitled = set()
+
+    def add_points(self, qdrant, points):
+        """Patch the graph for freshly upserted points and persist the change.
+
+        points is a list of PointStruct with vectors; neighbours come from a
+        single batched Qdrant search against the collection.
+        """
+        if not points:
+            return
+
+        responses = qdrant.search_batch(
+            collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+            requests=[
+                models.SearchRequest(
+                    vector=point.vector,
+                    limit=self.k + 1,
+                    params=search_params(),
+                    with_payload=models.PayloadSelectorInclude(include=["title"])
+                )
+                for point in points
+            ]
+        )
+
+        with self._locked():
+            self.refresh()
+            first_new = len(self.ids)
+            for point, hits in zip(points, responses):
+                node = self._node(str(point.id), point.payload.get("title", ""))
+                neighbors = []
+                for hit in hits:
+                    hit_id = str(hit.id)
+                    if hit_id == str(point.id):
+                        continue
+                    other = self._node(hit_id, (hit.payload or {}).get("title", ""))
+                    neighbors.append((other, float(hit.score)))
+                    # Reciprocal edge: the new paper may now be in the neighbour's top k
+                    self._offer(other, node, float(hit.score))
+                self._set_row(node, neighbors[:self.k])
+            self.version += 1
+            self._persist(first_new)
+
+    def rebuild(self, qdrant, page_size: int = 256):
+        """Recompute the whole graph from the collection (initial backfill)"""
+        with self._locked():
+            self.refresh()
+            self.version += 1
+            self.ids, self.titles, self.id_to_index = [], [], {}
+            self._indptr = np.zeros(1, dtype=np.int64)
+            self._indices = np.zeros(0, dtype=np.int32)
+            self._weights = np.zeros(0, dtype=np.float32)
+            self._rows = {}
+            offset = None
+            while True:
+                page, offset = qdrant.scroll(
+                    collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                    limit=page_size,
+                    offset=offset,
+                    with_payload=["title"],
+                    with_vectors=True
+                )
+                if page:
+                    responses = qdrant.search_batch(
+                        collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                        requests=[
+                            models.SearchRequest(
+                                vector=point.vector, limit=self.k + 1, params=search_params()
+                            )
+                            for point in page
+                        ]
+                    )
+                    for point, hits in zip(page, responses):
+                        node = self._node(str(point.id), point.payload.get("title", ""))
+                        self._set_row(node, [
+                            (self._node(str(hit.id), ""), float(hit.score))
+                            for hit in hits if str(hit.id) != str(point.id)
+                        ][:self.k])
+                if offset is None:
+                    break
+            self._compact()
+            self._touched = set()
+            self._retitled = set()
+
+    # ----- reads -----
+
+    def snapshot(self):
+        """Reload if needed and return an immutable view of the current graph.
+
+        The view (ids, titles and deduplicated edge arrays) is cached per
+        version, so repeated reads of an unchanged graph cost nothing.
+        """
+        with self._lock:
+            self.refresh()
+            if self._snapshot is None or self._snapshot["version"] != self.version:
+                src, dst, weights = self.edges()
+                self._snapshot = {
+                    "version": self.version,
+                    "ids": list(self.ids),
+                    "titles": list(self.titles),
+                    "src": src,
+                    "dst": dst,
+                    "weights": weights
+                }
+            return self._snapshot
+
+    def edges(self):
+        """Return undirected (src, dst, weight) edge arrays with duplicates removed"""
+        indptr, indices, weights = self.to_csr()
+        src = np.repeat(np.arange(len(self.ids), dtype=np.int32), np.diff(indptr))
+        lo = np.minimum(src, indices)
+        hi = np.maximum(src, indices)
+        _, unique = np.unique(lo.astype(np.int64) * len(self.ids) + hi, return_index=True)
+        return lo[unique], hi[unique], weights[unique]
+
+knn_graph = KnnGraphIndex(settings.KNN_GRAPH_PATH, settings.KNN_GRAPH_K, settings.KNN_GRAPH_COMPACT_RATIO)
+
+if __name__ == "__main__":
+    from qdrant_client import QdrantClient
+
+    client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    knn_graph.refresh()
+    knn_graph.rebuild(client)
+    print(f"Rebuilt kNN graph with {len(knn_graph)} papers (version {knn_graph.version})")
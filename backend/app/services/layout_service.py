@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from typing import List, Tuple
+import threading
+import time
+import numpy as np
+
+from backend.app.core.config import settings
+
+class LayoutService:
+    """Computes and caches 2D node positions for the graph endpoints.
+
+    Layouts are cached by (kind, graph key). When a graph of the same kind was
+    laid out before and only a small fraction of its nodes changed, the spring
+    layout is warm-started from the previous coordinates with fewer iterations.
+    Graphs larger than spectral_min_nodes use a sparse spectral projection.
+    """
+
+    def __init__(self, max_entries: int, spectral_min_nodes: int, warm_start_max_change: float):
+        self.max_entries = max_entries
+        self.spectral_min_nodes = spectral_min_nodes
+        self.warm_start_max_change = warm_start_max_change
+        self._cache = OrderedDict()
+        self._anchors = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def layout(self, kind: str, key, node_ids: List[str], src, dst, weights,
+               iterations: int = 50) -> Tuple[np.ndarray, float, str]:
+        """Return (positions, elapsed_ms, method) for the given edge list"""
+        started = time.perf_counter()
+        cache_key = (kind, key)
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return cached, (time.perf_counter() - started) * 1000, "cached"
+            self.misses += 1
+            anchors = self._anchors.get(kind)
+
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+
+        if len(node_ids) >= self.spectral_min_nodes:
+            positions = spectral_layout(len(node_ids), src, dst, weights)
+            method = "spectral"
+        else:
+            init, changed = self._warm_start(anchors, node_ids, src, dst)
+            if init is not None and changed <= self.warm_start_max_change:
+                iterations = max(10, iterations // 5)
+                method = "spring_warm"
+            else:
+                init = None
+                method = "spring"
+            positions = spring_layout(len(node_ids), src, dst, weights, iterations, init)
+
+        with self._lock:
+            self._cache[cache_key] = positions
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._anchors[kind] = dict(zip(node_ids, positions))
+
+        return positions, (time.perf_counter() - started) * 1000, method
+
+    @staticmethod
+    def _warm_start(anchors, node_ids, src, dst):
+        """Seed positions from the previous layout; new nodes start at their neighbours' centroid"""
+        if not anchors or not node_ids:
+            return None, 1.0
+        n = len(node_ids)
+        init = np.zeros((n, 2))
+        known = np.zeros(n, dtype=bool)
+        for i, paper_id in enumerate(node_ids):
+            pos = anchors.get(paper_id)
+            if pos is not None:
+                init[i] = pos
+                known[i] = True
+
+        changed = 1.0 - known.mean()
+        if changed > 0 and known.any():
+            # Accumulate known neighbour coordinates onto unknown nodes in both directions
+            both_src = np.concatenate([src, dst])
+            both_dst = np.concatenate([dst, src])
+            mask = known[both_src] & ~known[both_dst]
+            sums = np.zeros((n, 2))
+            counts = np.zeros(n)
+            np.add.at(sums, both_dst[mask], init[both_src[mask]])
+            np.add.at(counts, both_dst[mask], 1)
+            rng = np.random.default_rng(42)
+            unknown = np.flatnonzero(~known)
+            init[unknown] = rng.uniform(-1, 1, size=(len(unknown), 2))
+            has_neighbors = unknown[counts[unknown] > 0]
+            init[has_neighbors] = sums[has_neighbors] / counts[has_neighbors, None]
+        return init, changed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._cache)
+        }
+
+def spring_layout(n, src, dst, weights, iterations, init=None):
+    """Seeded force-directed layout through networkx"""
+    # networkx and scipy load on the first layout, not at API startup
+    import networkx as nx
+
+    G = nx.Graph()
+    G.add_nodes_from(range(n))
+    G.add_weighted_edges_from(zip(src.tolist(), dst.tolist(), weights.tolist()))
+    pos = None
+    if init is not None:
+        pos = {i: init[i] for i in range(n)}
+    layout = nx.spring_layout(
+        G, k=1/np.sqrt(max(n, 1)), pos=pos, iterations=iterations, seed=42
+    )
+    return np.array([layout[i] for i in range(n)])
+
+def spectral_layout(n, src, dst, weights, regularization=1.0):
+    """Project nodes onto the leading non-trivial eigenvectors of the normalized adjacency.
+
+    A small uniform teleport term keeps disconnected kNN components from
+    collapsing onto single points; it is applied implicitly so the operator
+    stays sparse.
+    """
+    # eigsh needs k < n and three eigenvectors are requested
+    if n <= 3:
+        return np.zeros((n, 2))
+    from scipy import sparse
+    from scipy.sparse.linalg import LinearOperator, eigsh
+
+    A = sparse.coo_matrix((weights, (src, dst)), shape=(n, n)).tocsr()
+    A = A + A.T
+    tau = regularization / n
+    deg = np.asarray(A.sum(axis=1)).ravel() + regularization
+    d_inv_sqrt = 1 / np.sqrt(deg)
+
+    def matvec(x):
+        y = d_inv_sqrt * np.ravel(x)
+        return d_inv_sqrt * (A @ y + tau * y.sum())
+
+    operator = LinearOperator((n, n), matvec=matvec, dtype=np.float64)
+    _, vectors = eigsh(operator, k=3, which="LA", v0=np.ones(n))
+    # eigsh returns ascending eigenvalues; the largest is the trivial one
+    coords = vectors[:, [1, 0]] * d_inv_sqrt[:, None]
+    coords -= coords.mean(axis=0)
+    scale = np.abs(coords).max()
+    return coords / scale if scale > 0 else coords
+
+layout_service = LayoutService(
+    max_entries=settings.LAYOUT_CACHE_ENTRIES,
+    spectral_min_nodes=settings.LAYOUT_SPECTRAL_MIN_NODES,
+    warm_start_max_change=settings.LAYOUT_WARM_START_MAX_CHANGE
+)
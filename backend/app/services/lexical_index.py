@@ -0,0 +1,359 @@
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+import math
+import os
+import re
+import tempfile
+import threading
+import numpy as np
+
+from backend.app.core.config import settings
+from backend.app.services.delta_log import DeltaLog, pack_strings, unpack_strings
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./:-][a-z0-9]+)*")
+_MAX_TOKEN_LENGTH = 64
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was we were which with"
+    .split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; DOIs, arXiv ids and hyphenated names are kept whole and also split"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if len(token) > _MAX_TOKEN_LENGTH:
+            continue
+        parts = {token}
+        if not token.isalnum():
+            # Every "/"-suffix, so "10.1234/abc" matches inside "doi.org/10.1234/abc"
+            pieces = re.split(r"[/:]", token)
+            parts.update("/".join(pieces[i:]) for i in range(1, len(pieces)))
+            parts.update(re.split(r"[./:-]", token))
+        tokens.extend(part for part in parts if part and part not in _STOPWORDS)
+    return tokens
+
+def document_text(paper: dict) -> str:
+    """Text indexed for a paper message or Qdrant payload"""
+    authors = paper.get("authors") or ""
+    if isinstance(authors, list):
+        authors = " ".join(authors)
+    return " ".join([paper.get("title", ""), authors, paper.get("abstract", ""), paper.get("link", "")])
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: each id scores the sum of 1 / (k + rank) over the lists it appears in"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, paper_id in enumerate(ranking, start=1):
+            scores[paper_id] = scores.get(paper_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class LexicalIndex:
+    """BM25 inverted index over paper titles, authors, abstracts and links.
+
+    Postings are stored CSR-style: one int32 doc array and one uint16 term
+    frequency array for all terms, sliced by an indptr per term. Papers added
+    since the base file was written sit in flat (term, doc, tf) array.array
+    deltas. Like the kNN graph, each worker batch appends its papers to a
+    delta log next to the .npz, and the deltas are merged into a new base
+    only once the log passes LEXICAL_INDEX_COMPACT_RATIO of the base size.
+    Readers apply new log records and query base and delta together.
+    """
+
+    def __init__(self, path: str, k1: float, b: float, compact_ratio: float):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.version = 0
+        self.generation = 0
+        self.ids: List[str] = []
+        self.id_to_index: Dict[str, int] = {}
+        self._lengths = array("I")
+        self._total_length = 0
+        self._terms: Dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.uint16)
+        self._delta_rows = array("i")
+        self._delta_docs = array("i")
+        self._delta_tfs = array("H")
+        self._delta = DeltaLog(path + ".delta")
+        self._delta_offset = None
+        self._base_stat = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ----- persistence -----
+
+    @contextmanager
+    def _locked(self):
+        """Serialize writers across worker processes with an advisory file lock"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merge(self):
+        """Fold the delta postings into the CSR arrays"""
+        if not self._delta_rows:
+            return
+        term_rows = np.concatenate([
+            np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int32), np.diff(self._indptr)),
+            np.frombuffer(self._delta_rows, dtype=np.int32)
+        ])
+        # Stable sort keeps each term's postings in ascending doc order
+        order = np.argsort(term_rows, kind="stable")
+        self._postings = np.concatenate([self._postings, np.frombuffer(self._delta_docs, dtype=np.int32)])[order]
+        self._tfs = np.concatenate([self._tfs, np.frombuffer(self._delta_tfs, dtype=np.uint16)])[order]
+        self._indptr = np.zeros(len(self._terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_rows, minlength=len(self._terms)), out=self._indptr[1:])
+        self._clear_delta()
+
+    def _clear_delta(self):
+        self._delta_rows = array("i")
+        self._delta_docs = array("i")
+        self._delta_tfs = array("H")
+
+    def _compact(self):
+        """Merge the deltas into a new base file and start an empty delta log"""
+        self._merge()
+        id_offsets, id_blob = pack_strings(self.ids)
+        term_offsets, term_blob = pack_strings(list(self._terms))
+        self.generation += 1
+        directory = os.path.dirname(self.path) or "."
+        # Write to a temp file and rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                version=np.int64(self.version),
+                generation=np.int64(self.generation),
+                id_offsets=id_offsets,
+                id_blob=id_blob,
+                lengths=np.frombuffer(self._lengths, dtype=np.uint32),
+                term_offsets=term_offsets,
+                term_blob=term_blob,
+                indptr=self._indptr,
+                postings=self._postings,
+                tfs=self._tfs
+            )
+        os.replace(tmp_path, self.path)
+        self._delta_offset = self._delta.reset(self.generation)
+        stat = os.stat(self.path)
+        self._base_stat = (stat.st_ino, stat.st_mtime_ns)
+
+    def _persist(self, first_doc: int, first_term: int, first_posting: int):
+        """Append the papers added since first_doc to the delta log, or compact once it has outgrown the base"""
+        try:
+            base_size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            base_size = 0
+        if not base_size or self._delta.size() > max(base_size * self.compact_ratio, 1 << 20):
+            self._compact()
+            return
+        id_offsets, id_blob = pack_strings(self.ids[first_doc:])
+        term_offsets, term_blob = pack_strings(list(self._terms)[first_term:])
+        self._delta_offset = self._delta.append(
+            self.generation,
+            self._delta_offset,
+            version=np.int64(self.version),
+            first_doc=np.int64(first_doc),
+            first_term=np.int64(first_term),
+            id_offsets=id_offsets,
+            id_blob=id_blob,
+            lengths=np.frombuffer(self._lengths, dtype=np.uint32)[first_doc:],
+            term_offsets=term_offsets,
+            term_blob=term_blob,
+            rows=np.frombuffer(self._delta_rows, dtype=np.int32)[first_posting:],
+            docs=np.frombuffer(self._delta_docs, dtype=np.int32)[first_posting:],
+            tfs=np.frombuffer(self._delta_tfs, dtype=np.uint16)[first_posting:]
+        )
+
+    def _apply(self, record):
+        """Add one delta log record written by another process"""
+        first_doc = int(record["first_doc"])
+        if first_doc != len(self.ids) or int(record["first_term"]) != len(self._terms):
+            raise ValueError(f"Lexical index delta does not follow the loaded index ({self.path})")
+        for paper_id in unpack_strings(record["id_offsets"], record["id_blob"]):
+            self.id_to_index[paper_id] = len(self.ids)
+            self.ids.append(paper_id)
+        for term in unpack_strings(record["term_offsets"], record["term_blob"]):
+            self._terms[term] = len(self._terms)
+        self._lengths.frombytes(record["lengths"].astype(np.uint32).tobytes())
+        self._total_length += int(record["lengths"].sum(dtype=np.int64))
+        self._delta_rows.frombytes(record["rows"].astype(np.int32).tobytes())
+        self._delta_docs.frombytes(record["docs"].astype(np.int32).tobytes())
+        self._delta_tfs.frombytes(record["tfs"].astype(np.uint16).tobytes())
+        self.version = int(record["version"])
+
+    def load(self):
+        stat = os.stat(self.path)
+        with np.load(self.path, allow_pickle=False) as data:
+            self.version = int(data["version"])
+            self.generation = int(data["generation"]) if "generation" in data.files else 0
+            if "id_blob" in data.files:
+                self.ids = unpack_strings(data["id_offsets"], data["id_blob"])
+                terms = unpack_strings(data["term_offsets"], data["term_blob"])
+            else:
+                # Files written before the delta log stored fixed-width string arrays
+                self.ids = data["ids"].tolist()
+                terms = data["terms"].tolist()
+            self._lengths = array("I", data["lengths"].tobytes())
+            self._terms = {term: row for row, term in enumerate(terms)}
+            self._indptr = data["indptr"]
+            self._postings = data["postings"]
+            self._tfs = data["tfs"]
+        self.id_to_index = {paper_id: i for i, paper_id in enumerate(self.ids)}
+        self._total_length = int(np.frombuffer(self._lengths, dtype=np.uint32).sum(dtype=np.int64))
+        self._clear_delta()
+        self._delta_offset = None
+        self._base_stat = (stat.st_ino, stat.st_mtime_ns)
+
+    def refresh(self) -> bool:
+        """Reload the base if another process replaced it, then apply new delta records"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        changed = False
+        if (stat.st_ino, stat.st_mtime_ns) != self._base_stat:
+            self.load()
+            changed = True
+        records, offset = self._delta.read(self.generation, self._delta_offset)
+        for record in records:
+            self._apply(record)
+        if offset is not None:
+            self._delta_offset = offset
+        return changed or bool(records)
+
+    # ----- updates -----
+
+    def _add(self, paper_id: str, text: str):
+        if paper_id in self.id_to_index:
+            # Paper ids are derived from the paper, so a known id means known content
+            return
+        doc = len(self.ids)
+        self.ids.append(paper_id)
+        self.id_to_index[paper_id] = doc
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        self._lengths.append(length)
+        self._total_length += length
+        for term, count in counts.items():
+            self._delta_rows.append(self._terms.setdefault(term, len(self._terms)))
+            self._delta_docs.append(doc)
+            self._delta_tfs.append(min(count, 65535))
+
+    def add_papers(self, papers):
+        """Index freshly stored papers (message dicts or payloads with a paper_id) and persist"""
+        if not papers:
+            return
+        with self._locked():
+            self.refresh()
+            first_doc, first_term, first_posting = len(self.ids), len(self._terms), len(self._delta_rows)
+            for paper in papers:
+                self._add(str(paper["paper_id"]), document_text(paper))
+            if len(self.ids) == first_doc:
+                return
+            self.version += 1
+            self._persist(first_doc, first_term, first_posting)
+
+    def rebuild(self, qdrant, page_size: int = 1000):
+        """Recompute the whole index from the collection (initial backfill)"""
+        with self._locked():
+            self.refresh()
+            self.version += 1
+            self.ids, self.id_to_index = [], {}
+            self._lengths, self._total_length = array("I"), 0
+            self._terms = {}
+            self._clear_delta()
+            self._indptr = np.zeros(1, dtype=np.int64)
+            self._postings = np.zeros(0, dtype=np.int32)
+            self._tfs = np.zeros(0, dtype=np.uint16)
+            offset = None
+            while True:
+                page, offset = qdrant.scroll(
+                    collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                    limit=page_size,
+                    offset=offset,
+                    with_payload=["title", "authors", "abstract", "link"],
+                    with_vectors=False
+                )
+                for point in page:
+                    self._add(str(point.id), document_text(point.payload or {}))
+                if offset is None:
+                    break
+            self._compact()
+
+    # ----- reads -----
+
+    def _postings_for(self, term: str):
+        row = self._terms.get(term)
+        if row is None:
+            return None, None
+        docs, tfs = [], []
+        if row < len(self._indptr) - 1:
+            start, end = self._indptr[row], self._indptr[row + 1]
+            docs.append(self._postings[start:end])
+            tfs.append(self._tfs[start:end])
+        if self._delta_rows:
+            # Papers appended since the base was written, bounded by the compaction threshold
+            mask = np.frombuffer(self._delta_rows, dtype=np.int32) == row
+            docs.append(np.frombuffer(self._delta_docs, dtype=np.int32)[mask])
+            tfs.append(np.frombuffer(self._delta_tfs, dtype=np.uint16)[mask])
+        return np.concatenate(docs), np.concatenate(tfs)
+
+    def search(self, query_text: str, limit: int) -> List[Tuple[str, float]]:
+        """Top `limit` (paper_id, BM25 score) pairs for the query"""
+        with self._lock:
+            self.refresh()
+            count = len(self.ids)
+            terms = set(tokenize(query_text))
+            if not count or not terms:
+                return []
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            average_length = max(self._total_length / count, 1.0)
+            scores = np.zeros(count, dtype=np.float32)
+            for term in terms:
+                docs, tfs = self._postings_for(term)
+                if docs is None:
+                    continue
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                tf = tfs.astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * lengths[docs] / average_length)
+                # Each doc appears once per term, so fancy-index accumulation is safe
+                scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+            matched = np.flatnonzero(scores)
+            if len(matched) > limit:
+                matched = matched[np.argpartition(scores[matched], -limit)[-limit:]]
+            matched = matched[np.argsort(scores[matched])[::-1]]
+            return [(self.ids[i], float(scores[i])) for i in matched]
+
+lexical_index = LexicalIndex(
+    settings.LEXICAL_INDEX_PATH, settings.BM25_K1, settings.BM25_B, settings.LEXICAL_INDEX_COMPACT_RATIO
+)
+
+if __name__ == "__main__":
+    from qdrant_client import QdrantClient
+
+    client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    lexical_index.refresh()
+    lexical_index.rebuild(client)
+    print(f"Rebuilt lexical index with {len(lexical_index)} papers (version {lexical_index.version})")
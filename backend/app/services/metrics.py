@@ -0,0 +1,80 @@
+import asyncio
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Latency buckets from 1ms to ~30s
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "API request latency", ["method", "route", "status"], buckets=_BUCKETS
+)
+EMBEDDING_SECONDS = Histogram(
+    "embedding_request_seconds", "Embedding provider call latency", ["provider", "mode"], buckets=_BUCKETS
+)
+EMBEDDING_TEXTS = Counter(
+    "embedding_texts_total", "Texts sent to the embedding provider", ["provider"]
+)
+QDRANT_SECONDS = Histogram(
+    "qdrant_request_seconds", "Qdrant call latency", ["operation"], buckets=_BUCKETS
+)
+GRAPH_BUILD_SECONDS = Histogram(
+    "graph_build_seconds", "Graph construction time, including layout", ["endpoint"], buckets=_BUCKETS
+)
+LAYOUT_SECONDS = Histogram(
+    "graph_layout_seconds", "Graph layout time", ["kind", "method"], buckets=_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups", ["cache", "result"]
+)
+
+WORKER_MESSAGES = Counter(
+    "worker_messages_consumed_total", "Messages consumed from the processing topic"
+)
+WORKER_PAPERS = Counter(
+    "worker_papers_total", "Papers by final status", ["status"]
+)
+WORKER_FAILURES = Counter(
+    "worker_failures_total", "Failed worker operations, counted per attempt", ["operation"]
+)
+WORKER_DEAD_LETTERS = Counter(
+    "worker_dead_letters_total", "Messages sent to the dead-letter topic"
+)
+WORKER_BATCH_SECONDS = Histogram(
+    "worker_batch_seconds", "End-to-end batch processing time", buckets=_BUCKETS
+)
+WORKER_BATCH_SIZE = Histogram(
+    "worker_batch_size", "Messages per batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+INGEST_FRESHNESS_SECONDS = Histogram(
+    "ingest_freshness_seconds", "Time from enqueue in the API until a paper is searchable",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+)
+CONSUMER_LAG = Gauge(
+    "kafka_consumer_lag", "Messages behind the partition high watermark", ["topic", "partition"]
+)
+
+def start_metrics_server(port: int):
+    """Serve /metrics for a worker process on its own port (0 disables it)"""
+    if port:
+        start_http_server(port)
+        print(f"Serving metrics on port {port}")
+
+class TimedQdrant:
+    """Wraps a sync or async Qdrant client and records every call's latency by method name"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+        histogram = QDRANT_SECONDS.labels(name)
+        if asyncio.iscoroutinefunction(attr):
+            async def call(*args, **kwargs):
+                with histogram.time():
+                    return await attr(*args, **kwargs)
+        else:
+            def call(*args, **kwargs):
+                with histogram.time():
+                    return attr(*args, **kwargs)
+        return call
@@ -1,19 +1,109 @@
 from typing import List
-import openai
+import asyncio
 from backend.app.core.config import settings
+from backend.app.services.embedding_cache import embedding_cache, EmbeddingCache
+from backend.app.services.embedding_providers import get_provider
+from backend.app.services.metrics import CACHE_REQUESTS, EMBEDDING_SECONDS, EMBEDDING_TEXTS
 
 class OpenAIHandler:
-    # Initialize OpenAI API key at class level
-    openai.api_key = settings.OPENAI_API_KEY
+    """Cached entry point for embeddings; the backing provider comes from EMBEDDING_MODEL"""
 
     @classmethod
     def generate_embedding(cls, text: str) -> List[float]:
-        """Generate embedding using OpenAI API"""
+        """Generate embedding for a single text"""
+        return cls.generate_embeddings([text])[0]
+
+    @classmethod
+    def generate_embeddings(cls, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts, requesting only cache misses from the provider"""
+        if not texts:
+            return []
+        if not settings.EMBEDDING_CACHE_ENABLED:
+            return cls._request_embeddings(texts)
+
+        keys = cls._cache_keys(texts)
+        cached = embedding_cache.get_many(keys)
+
+        # Deduplicate misses so repeated texts in one batch are embedded once
+        pending = cls._pending(keys, texts, cached)
+
+        if pending:
+            vectors = cls._request_embeddings(list(pending.values()))
+            fresh = dict(zip(pending.keys(), vectors))
+            embedding_cache.put_many(fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    @classmethod
+    async def agenerate_embedding(cls, text: str) -> List[float]:
+        """Generate embedding without blocking the event loop"""
+        return (await cls.agenerate_embeddings([text]))[0]
+
+    @classmethod
+    async def agenerate_embeddings(cls, texts: List[str]) -> List[List[float]]:
+        """Async variant of generate_embeddings for the API request path"""
+        if not texts:
+            return []
+        if not settings.EMBEDDING_CACHE_ENABLED:
+            return await cls._arequest_embeddings(texts)
+
+        keys = cls._cache_keys(texts)
+        # SQLite lookups are blocking, so keep them off the event loop
+        cached = await asyncio.to_thread(embedding_cache.get_many, keys)
+
+        pending = cls._pending(keys, texts, cached)
+
+        if pending:
+            vectors = await cls._arequest_embeddings(list(pending.values()))
+            fresh = dict(zip(pending.keys(), vectors))
+            await asyncio.to_thread(embedding_cache.put_many, fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    @staticmethod
+    def _cache_keys(texts: List[str]) -> List[str]:
+        return [
+            EmbeddingCache.make_key(text, settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM)
+            for text in texts
+        ]
+
+    @staticmethod
+    def _pending(keys, texts, cached):
+        pending = {}
+        misses = 0
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                misses += 1
+                if key not in pending:
+                    pending[key] = text
+        CACHE_REQUESTS.labels("embedding", "hit").inc(len(keys) - misses)
+        CACHE_REQUESTS.labels("embedding", "miss").inc(misses)
+        return pending
+
+    @classmethod
+    def _request_embeddings(cls, texts: List[str]) -> List[List[float]]:
+        """Embed texts in one provider call"""
+        provider = get_provider()
+        EMBEDDING_TEXTS.labels(provider.name).inc(len(texts))
         try:
-            response = openai.Embedding.create(
-                model=settings.EMBEDDING_MODEL,
-                input=text
-            )
-            return response['data'][0]['embedding']
+            with EMBEDDING_SECONDS.labels(provider.name, "sync").time():
+                return provider.embed(texts)
         except Exception as e:
-            raise Exception(f"Error generating embedding: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error generating embedding: {str(e)}")
+
+    @classmethod
+    async def _arequest_embeddings(cls, texts: List[str]) -> List[List[float]]:
+        """Embed texts in one async provider call"""
+        provider = get_provider()
+        EMBEDDING_TEXTS.labels(provider.name).inc(len(texts))
+        try:
+            with EMBEDDING_SECONDS.labels(provider.name, "async").time():
+                return await provider.aembed(texts)
+        except Exception as e:
+            raise Exception(f"Error generating embedding: {str(e)}")
+
+    @classmethod
+    async def aclose(cls):
+        await get_provider().aclose()
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from typing import Any, Optional
+import os
+import struct
+import threading
+import time
+
+from backend.app.core.config import settings
+from backend.app.services.embedding_cache import EmbeddingCache
+from backend.app.services.metrics import CACHE_REQUESTS
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+_COUNTER = struct.Struct("<q")
+
+class IngestVersion:
+    """Cross-process counter the worker increments after every upsert.
+
+    The counter is stored in a small file and incremented under flock, so two
+    bumps never yield the same version (a timestamp could within its
+    granularity). Readers only read the file, once per request.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def current(self) -> int:
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read(_COUNTER.size)
+        except FileNotFoundError:
+            return 0
+        return _COUNTER.unpack(raw)[0] if len(raw) == _COUNTER.size else 0
+
+    def bump(self) -> int:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            try:
+                # The API and the workers may run as different users or umasks
+                os.fchmod(fd, 0o666)
+            except PermissionError:
+                pass  # Created by another user, who already set the mode
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            raw = os.pread(fd, _COUNTER.size, 0)
+            version = (_COUNTER.unpack(raw)[0] if len(raw) == _COUNTER.size else 0) + 1
+            os.pwrite(fd, _COUNTER.pack(version), 0)
+            return version
+        finally:
+            os.close(fd)
+
+class QueryCache:
+    """TTL + LRU cache of search responses, tagged with the ingest version they were computed at"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, ingest_version: IngestVersion):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.ingest_version = ingest_version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def make_key(kind: str, query_text: str, top_k: int, *extra) -> tuple:
+        return (
+            kind,
+            settings.VECTOR_DB_COLLECTION_NAME,
+            EmbeddingCache.normalize(query_text),
+            top_k
+        ) + extra
+
+    def get(self, key, version: int) -> Optional[Any]:
+        """The cached value, unless papers were ingested since (version is ingest_version.current())"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                CACHE_REQUESTS.labels("query", "miss").inc()
+                return None
+            value, entry_version, expires_at = entry
+            if entry_version != version or expires_at < time.monotonic():
+                # New papers were ingested (or the entry aged out) since this was cached
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                CACHE_REQUESTS.labels("query", "stale").inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            CACHE_REQUESTS.labels("query", "hit").inc()
+            return value
+
+    def put(self, key, value, version: int):
+        """Cache value as computed at version, read from ingest_version before the search ran"""
+        with self._lock:
+            self._entries[key] = (value, version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "ingest_version": self.ingest_version.current()
+        }
+
+ingest_version = IngestVersion(settings.INGEST_VERSION_PATH)
+
+query_cache = QueryCache(
+    max_entries=settings.QUERY_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS,
+    ingest_version=ingest_version
+)
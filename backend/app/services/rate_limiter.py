@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+import asyncio
+import os
+import struct
+import threading
+import time
+
+from backend.app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+_STATE = struct.Struct("<dddd")  # request level, token level, updated_at, rate factor
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return max(1, len(text) // 4 + 1)
+
+class SharedRateLimiter:
+    """Token buckets for requests/min and tokens/min shared by every process on the host.
+
+    State lives in a small file guarded by flock, so the API and all worker
+    processes draw from the same quota. The effective rate adapts AIMD-style:
+    each rate-limit error halves it, each success adds back a small step up to
+    the configured limit. If the file cannot be opened or locked (e.g. it was
+    created by another user on a shared volume), the limiter falls back to
+    state held in this process rather than failing the embedding call.
+    """
+
+    def __init__(self, path: str, requests_per_minute: float, tokens_per_minute: float,
+                 burst_seconds: float, min_factor: float, increase_step: float, decrease_factor: float):
+        self.path = path
+        self.requests_per_second = requests_per_minute / 60
+        self.tokens_per_second = tokens_per_minute / 60
+        self.burst_seconds = burst_seconds
+        self.min_factor = min_factor
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self._fd = None
+        self._fd_pid = None
+        self._local_state = None
+        self._local_lock = threading.Lock()
+
+    def _file(self) -> int:
+        if self._fd is None or self._fd_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                # Every process sharing the volume must be able to write, whatever its uid or umask
+                os.fchmod(fd, 0o666)
+            except PermissionError:
+                pass  # Created by another user, who already set the mode
+            self._fd = fd
+            self._fd_pid = os.getpid()
+        return self._fd
+
+    def _refill(self, raw: bytes) -> list:
+        now = time.time()
+        if len(raw) == _STATE.size:
+            state = list(_STATE.unpack(raw))
+        else:
+            state = [self._capacity(self.requests_per_second, 1.0),
+                     self._capacity(self.tokens_per_second, 1.0), now, 1.0]
+        # Refill both buckets at the current adaptive rate
+        elapsed = max(0.0, now - state[2])
+        factor = state[3]
+        state[0] = min(self._capacity(self.requests_per_second, factor),
+                       state[0] + elapsed * self.requests_per_second * factor)
+        state[1] = min(self._capacity(self.tokens_per_second, factor),
+                       state[1] + elapsed * self.tokens_per_second * factor)
+        state[2] = now
+        return state
+
+    @contextmanager
+    def _state(self):
+        """Lock the shared file and yield a mutable [requests, tokens, updated_at, factor] list"""
+        try:
+            fd = self._file()
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError as e:
+            with self._local_state_lock(e) as state:
+                yield state
+            return
+        try:
+            state = self._refill(os.pread(fd, _STATE.size, 0))
+            yield state
+            os.pwrite(fd, _STATE.pack(*state), 0)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _local_state_lock(self, error: OSError):
+        """In-process buckets used while the shared state file is unavailable"""
+        with self._local_lock:
+            if self._local_state is None:
+                print(f"Rate limit state file {self.path} unavailable ({error}); limiting this process only")
+            state = self._refill(self._local_state or b"")
+            yield state
+            self._local_state = _STATE.pack(*state)
+
+    def _capacity(self, rate: float, factor: float) -> float:
+        return max(1.0, rate * factor * self.burst_seconds)
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take one request and `tokens` tokens; return 0 on success or the seconds to wait"""
+        with self._state() as state:
+            factor = state[3]
+            # A call larger than the bucket proceeds once the bucket is full and drives it negative
+            need_tokens = min(tokens, self._capacity(self.tokens_per_second, factor))
+            if state[0] >= 1 and state[1] >= need_tokens:
+                state[0] -= 1
+                state[1] -= tokens
+                return 0.0
+            wait_requests = (1 - state[0]) / (self.requests_per_second * factor)
+            wait_tokens = (need_tokens - state[1]) / (self.tokens_per_second * factor)
+            return max(wait_requests, wait_tokens, 0.01)
+
+    def acquire(self, tokens: int):
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int):
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """Additive increase back toward the configured limits"""
+        with self._state() as state:
+            state[3] = min(1.0, state[3] + self.increase_step)
+
+    def on_rate_limited(self):
+        """Multiplicative decrease and drain, so every process backs off together"""
+        with self._state() as state:
+            state[3] = max(self.min_factor, state[3] * self.decrease_factor)
+            state[0] = min(state[0], 0.0)
+            state[1] = min(state[1], 0.0)
+
+    def factor(self) -> float:
+        with self._state() as state:
+            return state[3]
+
+rate_limiter = SharedRateLimiter(
+    path=settings.RATE_LIMIT_STATE_PATH,
+    requests_per_minute=settings.OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.OPENAI_TOKENS_PER_MINUTE,
+    burst_seconds=settings.RATE_LIMIT_BURST_SECONDS,
+    min_factor=settings.RATE_LIMIT_MIN_FACTOR,
+    increase_step=settings.RATE_LIMIT_INCREASE_STEP,
+    decrease_factor=settings.RATE_LIMIT_DECREASE_FACTOR
+)
@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from typing import Iterable, Optional
+import asyncio
+import json
+import threading
+import time
+import uuid
+from confluent_kafka import Consumer
+
+from backend.app.core.config import settings
+
+# Statuses a paper does not leave without being resubmitted
+FINAL_STATUSES = frozenset({"completed", "duplicate", "error"})
+
+class StatusTable:
+    """Bounded LRU table of paper id -> (status, error, updated_at).
+
+    Only touched from the event loop (the status consumer hands events over
+    with call_soon_threadsafe), so it needs no lock. "completed" is terminal:
+    later events for the paper, e.g. a resubmission reported as duplicate,
+    do not replace it. Waiters subscribe to paper ids and receive every id
+    that changes on an asyncio queue.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._watchers = {}
+        self.evicted = 0
+
+    def get(self, paper_id: str) -> Optional[dict]:
+        entry = self._entries.get(paper_id)
+        if entry is None:
+            return None
+        status, error, updated_at = entry
+        result = {"paper_id": paper_id, "status": status, "updated_at": updated_at}
+        if error is not None:
+            result["error"] = error
+        return result
+
+    def update(self, paper_id: str, status: str, error: Optional[str] = None, updated_at: Optional[float] = None):
+        current = self._entries.get(paper_id)
+        if current is not None and current[0] == "completed":
+            return
+        self._entries[paper_id] = (status, error, updated_at or time.time())
+        self._entries.move_to_end(paper_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        for queue in self._watchers.get(paper_id, ()):
+            queue.put_nowait(paper_id)
+
+    def apply(self, events):
+        for event in events:
+            self.update(event["paper_id"], event["status"], event.get("error"), event.get("updated_at"))
+
+    def subscribe(self, paper_ids: Iterable[str]) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        for paper_id in paper_ids:
+            self._watchers.setdefault(paper_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, paper_ids: Iterable[str], queue: asyncio.Queue):
+        for paper_id in paper_ids:
+            watchers = self._watchers.get(paper_id)
+            if watchers is not None:
+                watchers.discard(queue)
+                if not watchers:
+                    del self._watchers[paper_id]
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evicted": self.evicted,
+            "watched_papers": len(self._watchers)
+        }
+
+class StatusConsumer:
+    """Background thread following KAFKA_STATUS_TOPIC into a StatusTable.
+
+    Every API process reads the whole topic under its own consumer group and
+    never commits, so each one sees every worker's events from the moment it
+    starts (STATUS_CONSUMER_OFFSET_RESET decides whether it replays retention).
+    """
+
+    def __init__(self, table: StatusTable):
+        self.table = table
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(loop,), name="status-consumer", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self, loop):
+        consumer = Consumer({
+            'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS,
+            'group.id': f'paper_status_api_{uuid.uuid4().hex}',
+            'auto.offset.reset': settings.STATUS_CONSUMER_OFFSET_RESET,
+            'enable.auto.commit': False,
+        })
+        consumer.subscribe([settings.KAFKA_STATUS_TOPIC])
+        try:
+            while not self._stop.is_set():
+                events = []
+                for msg in consumer.consume(num_messages=1000, timeout=0.5):
+                    if msg.error():
+                        print(f'Status consumer error: {msg.error()}')
+                        continue
+                    try:
+                        event = json.loads(msg.value().decode('utf-8'))
+                        if event.get("paper_id") and event.get("status"):
+                            events.append(event)
+                    except Exception as e:
+                        print(f"Error decoding status event: {str(e)}")
+                if events:
+                    loop.call_soon_threadsafe(self.table.apply, events)
+        except Exception as e:
+            print(f"Status consumer stopped: {str(e)}")
+        finally:
+            consumer.close()
+
+status_table = StatusTable(settings.STATUS_TABLE_MAX_ENTRIES)
+status_consumer = StatusConsumer(status_table)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def iter_status_events(table: StatusTable, paper_ids: list, queue: asyncio.Queue, timeout: float):
+    """Server-sent events for a set of papers: the current status of each, then every change.
+
+    Ends with a "done" event once every paper is final or the timeout passes.
+    The queue must come from table.subscribe(paper_ids) and is released here.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending = set(paper_ids)
+    sent = {}
+
+    def render(ids):
+        events = []
+        for paper_id in ids:
+            entry = table.get(paper_id)
+            if entry is None or sent.get(paper_id) == entry:
+                continue
+            sent[paper_id] = entry
+            if entry["status"] in FINAL_STATUSES:
+                pending.discard(paper_id)
+            events.append(_sse("status", entry))
+        return "".join(events)
+
+    try:
+        snapshot = render(paper_ids)
+        if snapshot:
+            yield snapshot
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                changed = [await asyncio.wait_for(queue.get(), min(remaining, 15))]
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            while not queue.empty():
+                changed.append(queue.get_nowait())
+            events = render(dict.fromkeys(changed))
+            if events:
+                yield events
+        yield _sse("done", {"final": len(paper_ids) - len(pending), "pending": sorted(pending)})
+    finally:
+        table.unsubscribe(paper_ids, queue)
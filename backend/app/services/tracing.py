@@ -0,0 +1,163 @@
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional
+import json
+import os
+import random
+import threading
+import time
+
+from backend.app.core.config import settings
+from backend.app.services.metrics import INGEST_FRESHNESS_SECONDS
+
+# W3C trace context header, so an OpenTelemetry consumer can continue the same trace
+TRACEPARENT = "traceparent"
+ENQUEUED_AT = "enqueued_at"
+TRACE_HEADERS = (TRACEPARENT, ENQUEUED_AT)
+
+class TraceContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+    enqueued_at: Optional[float]
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+def new_trace_headers() -> list:
+    """Kafka headers that start the ingest trace of one paper.
+
+    The span id names the paper's root "paper.ingest" span: it starts at the
+    enqueue time carried alongside and is ended by the worker once the paper
+    is searchable.
+    """
+    if not settings.TRACING_ENABLED:
+        return []
+    flags = "01" if random.random() < settings.TRACE_SAMPLE_RATE else "00"
+    return [
+        (TRACEPARENT, f"00-{_new_id(16)}-{_new_id(8)}-{flags}".encode("ascii")),
+        (ENQUEUED_AT, repr(time.time()).encode("ascii"))
+    ]
+
+def trace_headers(msg) -> list:
+    """The trace headers of a consumed message, to forward when it is re-produced"""
+    return [(key, value) for key, value in msg.headers() or [] if key in TRACE_HEADERS]
+
+def trace_context(msg) -> Optional[TraceContext]:
+    """Parse a message's trace headers; None for messages produced without them"""
+    headers = dict(trace_headers(msg))
+    try:
+        _, trace_id, span_id, flags = headers[TRACEPARENT].decode("ascii").split("-")
+        enqueued_at = float(headers[ENQUEUED_AT]) if ENQUEUED_AT in headers else None
+    except (KeyError, ValueError, UnicodeDecodeError):
+        return None
+    return TraceContext(trace_id, span_id, int(flags, 16) & 1 == 1, enqueued_at)
+
+class SpanExporter:
+    """Writes finished spans as JSON lines, to stdout or appended to TRACE_LOG_PATH.
+
+    Records use OpenTelemetry field names (hex ids, unix nanosecond
+    timestamps, attributes, links), so a collector's file receiver can ingest
+    the log as is.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, name, trace_id, span_id, start, end, parent_span_id=None, attributes=None, links=None):
+        record = {
+            "name": name,
+            "trace_id": trace_id,
+            "span_id": span_id,
+            "parent_span_id": parent_span_id,
+            "start_time_unix_nano": int(start * 1e9),
+            "end_time_unix_nano": int(end * 1e9),
+            "duration_ms": round((end - start) * 1000, 3),
+            "attributes": attributes or {},
+            "links": links or []
+        }
+        line = json.dumps(record)
+        with self._lock:
+            if not self.path:
+                print(line)
+                return
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+span_exporter = SpanExporter(settings.TRACE_LOG_PATH)
+
+class BatchTrace:
+    """Spans for one worker batch.
+
+    A "worker.batch" root span gets a child span per stage and links to the
+    ingest traces of its sampled messages; each paper's own "paper.ingest"
+    span, from enqueue to searchable, is closed through `papers`.
+    """
+
+    def __init__(self, worker_id, messages):
+        self.worker_id = str(worker_id)
+        self.trace_id = _new_id(16)
+        self.span_id = _new_id(8)
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.messages = len(messages)
+        self.contexts = [trace_context(msg) for msg in messages] if settings.TRACING_ENABLED else []
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time one stage of the batch as a child span"""
+        start = time.time()
+        try:
+            yield
+        except Exception as e:
+            attributes["error"] = str(e)
+            raise
+        finally:
+            if settings.TRACING_ENABLED:
+                span_exporter.export(
+                    name, self.trace_id, _new_id(8), start, time.time(),
+                    parent_span_id=self.span_id, attributes=attributes
+                )
+
+    def papers(self, papers: List[dict], sources: dict, status: str):
+        """End the ingest span of each paper (call right after the upsert) and record its freshness"""
+        if not settings.TRACING_ENABLED:
+            return
+        end = time.time()
+        for paper in papers:
+            context = trace_context(sources[str(paper["paper_id"])])
+            if context is None:
+                continue
+            if context.enqueued_at is not None and status == "completed":
+                INGEST_FRESHNESS_SECONDS.observe(max(end - context.enqueued_at, 0.0))
+            if context.sampled:
+                span_exporter.export(
+                    "paper.ingest", context.trace_id, context.span_id,
+                    context.enqueued_at or self.start, end,
+                    attributes={
+                        "paper_id": str(paper["paper_id"]),
+                        "status": status,
+                        "worker": self.worker_id,
+                        "queue_ms": round((self.start - (context.enqueued_at or self.start)) * 1000, 3)
+                    },
+                    links=[{"trace_id": self.trace_id, "span_id": self.span_id}]
+                )
+
+    def finish(self, **attributes):
+        if not settings.TRACING_ENABLED:
+            return
+        links = [
+            {"trace_id": context.trace_id, "span_id": context.span_id}
+            for context in self.contexts if context is not None and context.sampled
+        ]
+        span_exporter.export(
+            "worker.batch", self.trace_id, self.span_id, self.start, time.time(),
+            attributes={"worker": self.worker_id, "messages": self.messages, **attributes},
+            links=links
+        )
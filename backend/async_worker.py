@@ -0,0 +1,280 @@
+from collections import deque
+from confluent_kafka import TopicPartition
+import asyncio
+import random
+import threading
+import time
+
+from backend.app.core.config import settings
+from backend.app.services.openai_handler import OpenAIHandler
+from backend.app.services.metrics import (
+    WORKER_BATCH_SECONDS, WORKER_BATCH_SIZE, WORKER_FAILURES, WORKER_MESSAGES
+)
+from backend.app.services.tracing import BatchTrace
+from backend.worker import WorkerService
+
+class OffsetTracker:
+    """Releases commit offsets per partition only once every earlier batch has finished.
+
+    Batches complete out of order when several embed/upsert tasks run at once;
+    committing a later batch first would skip an earlier one after a crash.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def track(self, batch_id, messages):
+        highest = {}
+        for msg in messages:
+            key = (msg.topic(), msg.partition())
+            highest[key] = max(highest.get(key, -1), msg.offset())
+        with self._lock:
+            for key, offset in highest.items():
+                self._pending.setdefault(key, deque()).append([batch_id, offset + 1, False])
+
+    def complete(self, batch_id):
+        """Mark a batch finished and return the offsets that are now safe to commit"""
+        commits = []
+        with self._lock:
+            for (topic, partition), entries in self._pending.items():
+                for entry in entries:
+                    if entry[0] == batch_id:
+                        entry[2] = True
+                offset = None
+                while entries and entries[0][2]:
+                    offset = entries.popleft()[1]
+                if offset is not None:
+                    commits.append(TopicPartition(topic, partition, offset))
+        return commits
+
+    def revoke(self, partitions):
+        with self._lock:
+            for p in partitions:
+                self._pending.pop((p.topic, p.partition), None)
+
+class AsyncWorkerService(WorkerService):
+    """Single-process worker for every partition, built as a consume -> embed -> upsert pipeline.
+
+    Stages are connected by bounded asyncio queues. When the embed queue is
+    full the consumer pauses its partitions instead of buffering more input,
+    and resumes once the queue drains.
+    """
+
+    def __init__(self):
+        self.tracker = OffsetTracker()
+        super().__init__("async")
+
+    def _on_revoke(self, consumer, partitions):
+        self.tracker.revoke(partitions)
+        super()._on_revoke(consumer, partitions)
+
+    @staticmethod
+    def _backoff(attempt):
+        return random.uniform(0, min(
+            settings.WORKER_RETRY_MAX_BACKOFF_SECONDS,
+            settings.WORKER_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        ))
+
+    async def _awith_retry(self, description, make_call, retries=None):
+        """Async counterpart of _with_retry; make_call returns a fresh awaitable per attempt"""
+        retries = settings.WORKER_MAX_RETRIES if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                return await make_call()
+            except Exception as e:
+                WORKER_FAILURES.labels(description).inc()
+                attempt += 1
+                if attempt > retries:
+                    raise
+                delay = self._backoff(attempt)
+                print(
+                    f"Worker {self.worker_id} {description} failed "
+                    f"(attempt {attempt}/{retries}): {str(e)}; retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _abisect(self, description, call, items, retries=None):
+        """Async counterpart of _bisect; call(chunk) returns a fresh awaitable"""
+        try:
+            return [(items, await self._awith_retry(description, lambda: call(items), retries=retries))], []
+        except Exception as e:
+            if len(items) == 1:
+                return [], [(items[0], e)]
+            print(f"Worker {self.worker_id} {description} of {len(items)} items failed, splitting: {str(e)}")
+            middle = len(items) // 2
+            done, failed = await self._abisect(description, call, items[:middle], retries=1)
+            more_done, more_failed = await self._abisect(description, call, items[middle:], retries=1)
+            return done + more_done, failed + more_failed
+
+    async def _aprepare(self, messages):
+        """Run _prepare until it succeeds.
+
+        It only fails when Qdrant cannot be reached for the duplicate lookup,
+        which says nothing about the papers, so the batch is retried in place
+        (as the process-mode worker replays it) rather than dead-lettered.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.to_thread(self._prepare, messages)
+            except Exception as e:
+                attempt += 1
+                delay = self._backoff(attempt)
+                print(f"Worker {self.worker_id} could not prepare batch: {str(e)}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def _fail_each(self, failed, sources, trace):
+        for paper, error in failed:
+            self._fail([paper], sources, error)
+        trace.papers([paper for paper, _ in failed], sources, "error")
+
+    async def _hold(self, embed_queue):
+        """Pause all assigned partitions until the embed stage has room again"""
+        partitions = self.consumer.assignment()
+        self.consumer.pause(partitions)
+        print(f"Worker {self.worker_id} paused {len(partitions)} partitions (pipeline full)")
+        while embed_queue.full():
+            # Keep serving the group protocol while paused
+            msg = await asyncio.to_thread(self.consumer.poll, 0.5)
+            if msg is not None and not msg.error():
+                # Fetched before the pause took effect: redeliver it after resuming
+                self.consumer.seek(TopicPartition(msg.topic(), msg.partition(), msg.offset()))
+        self.consumer.resume(partitions)
+
+    async def _consume_stage(self, embed_queue):
+        batch_id = 0
+        while True:
+            if embed_queue.full():
+                await self._hold(embed_queue)
+            messages = await asyncio.to_thread(self._drain_batch)
+            if not messages:
+                self.producer.poll(0)
+                continue
+            self.tracker.track(batch_id, messages)
+            WORKER_MESSAGES.inc(len(messages))
+            WORKER_BATCH_SIZE.observe(len(messages))
+            await embed_queue.put((batch_id, messages, BatchTrace(self.worker_id, messages)))
+            batch_id += 1
+
+    async def _embed(self, messages, trace):
+        """Decode and embed a batch; returns the built points, papers by id and sources"""
+        with trace.span("decode"):
+            papers, sources = await self._aprepare(messages)
+        points = []
+        if papers:
+            # One embedding request per batch, split only to isolate papers that keep failing
+            with trace.span("embed", papers=len(papers)):
+                embedded, failed = await self._abisect(
+                    "embedding",
+                    lambda chunk: OpenAIHandler.agenerate_embeddings(self._texts(chunk)),
+                    papers
+                )
+            points, unbuilt = self._build_points(embedded)
+            self._fail_each(failed + unbuilt, sources, trace)
+        return points, {str(paper['paper_id']): paper for paper in papers}, sources
+
+    async def _embed_stage(self, embed_queue, upsert_queue):
+        while True:
+            batch_id, messages, trace = await embed_queue.get()
+            try:
+                attempt = 0
+                while True:
+                    try:
+                        points, papers, sources = await self._embed(messages, trace)
+                        break
+                    except Exception as e:
+                        # Invalid papers are dead-lettered in _prepare and failing ones isolated
+                        # above, so this says nothing about the papers: replay the batch in place
+                        attempt += 1
+                        delay = self._backoff(attempt)
+                        print(f"Worker {self.worker_id} embed stage failed: {str(e)}; retrying in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                await upsert_queue.put((batch_id, points, papers, sources, trace))
+            finally:
+                embed_queue.task_done()
+
+    async def _upsert_stage(self, upsert_queue):
+        while True:
+            batch_id, points, papers, sources, trace = await upsert_queue.get()
+            stored = []
+            stored_points = []
+            try:
+                if points:
+                    with trace.span("upsert", points=len(points)):
+                        upserted, failed = await self._abisect(
+                            "upsert",
+                            lambda chunk: asyncio.to_thread(
+                                self.qdrant.upsert,
+                                collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                                points=chunk
+                            ),
+                            points
+                        )
+                    stored_points = [point for chunk, _ in upserted for point in chunk]
+                    stored = [papers[str(point.id)] for point in stored_points]
+                    trace.papers(stored, sources, "completed")
+                    self._fail_each([(papers[str(point.id)], error) for point, error in failed], sources, trace)
+
+                if stored:
+                    with trace.span("index"):
+                        await asyncio.to_thread(self._after_upsert, stored, stored_points)
+            except Exception as e:
+                print(f"Worker {self.worker_id} post-upsert bookkeeping failed: {str(e)}")
+            finally:
+                await self._finish(batch_id, len(stored), trace)
+                upsert_queue.task_done()
+
+    async def _finish(self, batch_id, stored, trace):
+        commits = self.tracker.complete(batch_id)
+        if commits:
+            # Status and dead-letter messages must be durable before their inputs are committed
+            await asyncio.to_thread(self.producer.flush)
+            try:
+                await asyncio.to_thread(self.consumer.commit, offsets=commits, asynchronous=False)
+            except Exception as e:
+                print(f"Worker {self.worker_id} commit failed: {str(e)}")
+            self._update_lag()
+
+        elapsed = time.perf_counter() - trace.started
+        WORKER_BATCH_SECONDS.observe(elapsed)
+        trace.finish(stored=stored)
+        rate = stored / elapsed if elapsed > 0 else 0.0
+        print(
+            f"Worker {self.worker_id} processed batch of {stored} papers "
+            f"in {elapsed:.2f}s ({rate:.1f} papers/s)"
+        )
+
+    async def run(self):
+        embed_queue = asyncio.Queue(maxsize=settings.WORKER_QUEUE_SIZE)
+        upsert_queue = asyncio.Queue(maxsize=settings.WORKER_QUEUE_SIZE)
+        tasks = [asyncio.create_task(self._consume_stage(embed_queue))]
+        tasks += [
+            asyncio.create_task(self._embed_stage(embed_queue, upsert_queue))
+            for _ in range(settings.WORKER_EMBED_CONCURRENCY)
+        ]
+        tasks += [
+            asyncio.create_task(self._upsert_stage(upsert_queue))
+            for _ in range(settings.WORKER_UPSERT_CONCURRENCY)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await OpenAIHandler.aclose()
+
+    def process_papers(self):
+        """Run the pipelined worker until interrupted"""
+        try:
+            print("Starting async paper processing worker...")
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            print("Shutting down...")
+        finally:
+            self.consumer.close()
+            self.producer.flush()
+
+if __name__ == "__main__":
+    AsyncWorkerService().process_papers()
@@ -0,0 +1,479 @@
+# benchmark.py
+"""End-to-end latency and throughput benchmark.
+
+Runs /add_paper -> queue -> WorkerService -> Qdrant and the search endpoints
+in one process against local stand-ins: the fake embedding provider, an
+in-process queue in place of Kafka and local-mode Qdrant (or a real Qdrant
+server with --qdrant-url). The corpus grows through each requested size and
+every step reports p50/p95/p99 latencies, ingest papers/sec and peak RSS,
+alongside the API's cold-start import time, as JSON that can be diffed
+between commits:
+
+    python -m backend.benchmark --sizes 1000 10000 --output bench.json
+"""
+from collections import defaultdict, deque
+from contextlib import contextmanager, redirect_stdout
+from urllib.parse import urlparse
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+def configure_environment(args, workdir):
+    """Point every setting at the stand-ins; variables already set in the environment win"""
+    defaults = {
+        "EMBEDDING_MODEL": "fake",
+        "EMBEDDING_DIM": str(args.dim),
+        "EMBEDDING_RATE_LIMIT_ENABLED": "false",
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+        "RATE_LIMIT_STATE_PATH": os.path.join(workdir, "openai_rate_limit"),
+        "INGEST_VERSION_PATH": os.path.join(workdir, "ingest_version"),
+        "DEDUP_BLOOM_PATH": os.path.join(workdir, "dedup_bloom.bin"),
+        "KNN_GRAPH_PATH": os.path.join(workdir, "knn_graph.npz"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.npz"),
+        "TRACE_LOG_PATH": os.path.join(workdir, "traces.jsonl"),
+        # Measure the uncached search path unless asked otherwise
+        "QUERY_CACHE_ENABLED": "true" if args.query_cache else "false",
+        "VECTOR_DB_COLLECTION_NAME": f"bench_{int(time.time())}",
+    }
+    if args.qdrant_url:
+        url = urlparse(args.qdrant_url)
+        defaults["QDRANT_HOST"] = url.hostname or "localhost"
+        defaults["QDRANT_PORT"] = str(url.port or 6333)
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+# ----- in-process stand-in for Kafka -----
+
+class BenchMessage:
+    def __init__(self, topic, partition, offset, value, key, headers):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._value = value
+        self._key = key
+        self._headers = headers
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def value(self):
+        return self._value
+
+    def key(self):
+        return self._key
+
+    def headers(self):
+        return self._headers
+
+    def error(self):
+        return None
+
+class InProcessBroker:
+    """Single-partition topics held in memory, shared by the API producer and the worker"""
+
+    def __init__(self):
+        self.topics = defaultdict(deque)
+        self.offsets = defaultdict(int)
+
+    def append(self, topic, value, key, headers):
+        msg = BenchMessage(topic, 0, self.offsets[topic], value, key, headers)
+        self.offsets[topic] += 1
+        self.topics[topic].append(msg)
+        return msg
+
+    def pending(self, topic):
+        return len(self.topics[topic])
+
+    def producer(self, config=None):
+        return BenchProducer(self)
+
+    def consumer(self, config=None):
+        return BenchConsumer(self)
+
+class BenchProducer:
+    def __init__(self, broker):
+        self.broker = broker
+        self._callbacks = []
+
+    def produce(self, topic, value=None, key=None, callback=None, headers=None, **kwargs):
+        msg = self.broker.append(topic, value, key, headers)
+        if callback is not None:
+            self._callbacks.append((callback, msg))
+
+    def poll(self, timeout=0):
+        served = len(self._callbacks)
+        for callback, msg in self._callbacks:
+            callback(None, msg)
+        self._callbacks = []
+        return served
+
+    def flush(self, timeout=None):
+        self.poll(0)
+        return 0
+
+    def __len__(self):
+        return len(self._callbacks)
+
+class BenchConsumer:
+    def __init__(self, broker):
+        self.broker = broker
+        self.topics = []
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None):
+        self.topics = list(topics)
+
+    def consume(self, num_messages=1, timeout=-1):
+        batch = []
+        for topic in self.topics:
+            queue = self.broker.topics[topic]
+            while queue and len(batch) < num_messages:
+                batch.append(queue.popleft())
+        if not batch and timeout and timeout > 0:
+            # Block like a real consumer waiting for messages
+            time.sleep(timeout)
+        return batch
+
+    def poll(self, timeout=None):
+        batch = self.consume(1, timeout)
+        return batch[0] if batch else None
+
+    def commit(self, *args, **kwargs):
+        pass
+
+    def seek(self, partition):
+        pass
+
+    def assignment(self):
+        return []
+
+    def position(self, partitions):
+        return partitions
+
+    def pause(self, partitions):
+        pass
+
+    def resume(self, partitions):
+        pass
+
+    def close(self):
+        pass
+
+class AsyncLocalQdrant:
+    """Async facade over a sync local-mode client, so the API and the worker share one store.
+
+    Local mode is not thread-safe, so calls run inline on the event loop.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+# ----- synthetic corpus -----
+
+_SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vi", "zo", "qu", "sh", "en", "ar", "is", "ol", "um", "ex"]
+
+class Corpus:
+    """Deterministic synthetic papers with Zipf-distributed vocabulary"""
+
+    def __init__(self, seed, vocabulary=5000, authors=2000):
+        self.rng = np.random.default_rng(seed)
+        self.words = self._words(vocabulary)
+        self.surnames = [word.capitalize() for word in self._words(authors, offset=vocabulary)]
+        weights = 1.0 / np.arange(1, vocabulary + 1)
+        self.word_p = weights / weights.sum()
+
+    @staticmethod
+    def _words(count, offset=0):
+        words = []
+        for i in range(offset, offset + count):
+            syllables = []
+            n = i + 1
+            while n:
+                n, r = divmod(n, len(_SYLLABLES))
+                syllables.append(_SYLLABLES[r])
+            words.append("".join(syllables))
+        return words
+
+    def text(self, length):
+        return " ".join(self.rng.choice(self.words, size=length, p=self.word_p))
+
+    def paper(self, index):
+        published = np.datetime64("1990-01-01") + int(self.rng.integers(0, 35 * 365))
+        return {
+            "title": self.text(8).capitalize(),
+            "abstract": self.text(120),
+            "authors": ", ".join(self.rng.choice(self.surnames, size=3)),
+            "published": str(published),
+            "link": f"https://arxiv.org/abs/{index:08d}"
+        }
+
+    def query(self):
+        return self.text(int(self.rng.integers(3, 7)))
+
+# ----- measurement -----
+
+def summarize(samples_ms):
+    if not samples_ms:
+        return {"count": 0}
+    samples = np.asarray(samples_ms)
+    return {
+        "count": len(samples),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "mean_ms": round(float(samples.mean()), 3)
+    }
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+def cold_start_ms(runs=3):
+    """Median wall time for a fresh interpreter to import the API app"""
+    script = (
+        "import time; started = time.perf_counter(); import backend.main; "
+        "print((time.perf_counter() - started) * 1000)"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return round(float(np.median(samples)), 1)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+class Benchmark:
+
+    def __init__(self, args):
+        self.args = args
+        self.quiet = not args.verbose
+        self.corpus = Corpus(args.seed)
+        self.broker = InProcessBroker()
+        self.ingested = 0
+        self.ingest_seconds = 0.0
+
+        # Imported here so configure_environment has run first
+        from fastapi.testclient import TestClient
+        from qdrant_client import QdrantClient
+        from backend import worker as worker_module
+        from backend.app.core.config import settings
+        from backend.app.services import status_tracker
+        from backend.app.services.clients import services
+        from backend.app.services.metrics import TimedQdrant
+        from backend.main import app
+
+        self.settings = settings
+        services.producer = self.broker.producer()
+        worker_module.Consumer = self.broker.consumer
+        worker_module.Producer = self.broker.producer
+        status_tracker.Consumer = self.broker.consumer
+        if not args.qdrant_url:
+            store = QdrantClient(":memory:")
+            worker_module.QdrantClient = lambda **kwargs: store
+            services.qdrant = TimedQdrant(AsyncLocalQdrant(store))
+
+        with self._quiet():
+            self.worker = worker_module.WorkerService("bench")
+        self.client_context = TestClient(app)
+        self.client = self.client_context.__enter__()
+
+    def close(self):
+        self.client_context.__exit__(None, None, None)
+        if self.args.qdrant_url:
+            self.worker.qdrant.delete_collection(self.settings.VECTOR_DB_COLLECTION_NAME)
+
+    @contextmanager
+    def _quiet(self):
+        if self.quiet:
+            with redirect_stdout(io.StringIO()):
+                yield
+        else:
+            yield
+
+    def _post(self, path, **kwargs):
+        response, elapsed = timed(self.client.post, path, **kwargs)
+        response.raise_for_status()
+        return response, elapsed
+
+    def ingest(self, target):
+        """Grow the corpus to target papers: sampled /add_paper calls, the rest via /add_papers"""
+        count = target - self.ingested
+        add_paper_ms = []
+        bulk_seconds = 0.0
+        with self._quiet():
+            singles = min(self.args.add_samples, count)
+            for i in range(singles):
+                _, elapsed = self._post("/add_paper", json=self.corpus.paper(self.ingested + i))
+                add_paper_ms.append(elapsed)
+            start = self.ingested + singles
+            while start < target:
+                end = min(start + self.args.bulk_size, target)
+                papers = [self.corpus.paper(i) for i in range(start, end)]
+                _, elapsed = self._post("/add_papers", json=papers)
+                bulk_seconds += elapsed / 1000
+                start = end
+
+            # Drain the queue through the worker, timing only the batch processing
+            processing = 0.0
+            batch_ms = []
+            topic = self.settings.KAFKA_PROCESSING_TOPIC
+            while self.broker.pending(topic):
+                messages = self.worker._drain_batch()
+                if messages:
+                    _, elapsed = timed(self.worker.process_batch, messages)
+                    batch_ms.append(elapsed)
+                    processing += elapsed / 1000
+
+        self.ingested = target
+        self.ingest_seconds += processing
+        bulk_count = count - singles
+        return {
+            "papers": count,
+            "add_paper": summarize(add_paper_ms),
+            "add_papers_per_sec": round(bulk_count / bulk_seconds, 1) if bulk_seconds else None,
+            "worker_batch": summarize(batch_ms),
+            "worker_papers_per_sec": round(count / processing, 1) if processing else None,
+            "dead_letters": self.broker.pending(self.settings.KAFKA_DEAD_LETTER_TOPIC)
+        }
+
+    def measure_queries(self):
+        args = self.args
+        results = {}
+        with self._quiet():
+            for mode in ["vector", "hybrid"]:
+                samples = []
+                for _ in range(args.queries):
+                    body = {"query_text": self.corpus.query(), "top_k": args.top_k, "mode": mode}
+                    samples.append(self._post("/query", json=body)[1])
+                results[f"query_{mode}"] = summarize(samples)
+
+            samples = []
+            for _ in range(max(1, args.queries // args.batch_queries)):
+                body = {"queries": [
+                    {"query_text": self.corpus.query(), "top_k": args.top_k}
+                    for _ in range(args.batch_queries)
+                ]}
+                samples.append(self._post("/query_batch", json=body)[1])
+            results["query_batch"] = {**summarize(samples), "queries_per_request": args.batch_queries}
+
+            samples = []
+            for _ in range(args.graph_queries):
+                body = {"query_text": self.corpus.query(), "top_k": args.graph_top_k}
+                samples.append(self._post("/search_graph", json=body)[1])
+            results["search_graph"] = summarize(samples)
+
+            if self.ingested <= args.vector_graph_max:
+                # The first request after ingest lays out the new graph; later ones hit the cache
+                cold = [self._post("/vector_graph")[1]]
+                warm = [self._post("/vector_graph")[1] for _ in range(args.graph_queries)]
+                results["vector_graph_cold"] = summarize(cold)
+                results["vector_graph_warm"] = summarize(warm)
+            else:
+                results["vector_graph"] = {"skipped": f"more than {args.vector_graph_max} papers"}
+        return results
+
+    def run(self):
+        steps = []
+        for size in sorted(self.args.sizes):
+            if size <= self.ingested:
+                continue
+            print(f"Benchmarking {size} papers...", file=sys.stderr)
+            ingest = self.ingest(size)
+            steps.append({
+                "papers": size,
+                "ingest": ingest,
+                "endpoints": self.measure_queries(),
+                "peak_rss_mb": peak_rss_mb()
+            })
+        return steps
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against local stand-ins")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="Corpus sizes to measure at; the corpus grows through each (up to 1000000)")
+    parser.add_argument("--dim", type=int, default=256, help="Embedding dimension of the fake provider")
+    parser.add_argument("--queries", type=int, default=100, help="Samples per /query mode")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-queries", type=int, default=32, help="Queries per /query_batch request")
+    parser.add_argument("--graph-queries", type=int, default=10, help="Samples per graph endpoint")
+    parser.add_argument("--graph-top-k", type=int, default=50)
+    parser.add_argument("--vector-graph-max", type=int, default=20000,
+                        help="Skip /vector_graph above this many papers")
+    parser.add_argument("--add-samples", type=int, default=200,
+                        help="Papers per step sent through /add_paper; the rest use /add_papers")
+    parser.add_argument("--bulk-size", type=int, default=1000)
+    parser.add_argument("--qdrant-url", help="Use a real Qdrant server instead of local mode")
+    parser.add_argument("--query-cache", action="store_true", help="Leave the /query result cache on")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show API and worker logs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="paper_bench_") as workdir:
+        configure_environment(args, workdir)
+        cold_start = cold_start_ms()
+        benchmark = Benchmark(args)
+        try:
+            started = time.perf_counter()
+            steps = benchmark.run()
+        finally:
+            benchmark.close()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {
+            "qdrant": args.qdrant_url or "local",
+            "embedding_dim": args.dim,
+            "worker_batch_size": benchmark.settings.WORKER_BATCH_SIZE,
+            "query_cache": args.query_cache,
+            "seed": args.seed
+        },
+        "elapsed_seconds": round(time.perf_counter() - started, 1),
+        "api_cold_start_ms": cold_start,
+        "steps": steps
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,46 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import sys
+import time
+from fastapi import FastAPI, Request
 
-from backend.app.api.routes import router
+from backend.app.api.routes import router, warm_dedup_index
+from backend.app.services.clients import services
+from backend.app.services.openai_handler import OpenAIHandler
+from backend.app.services.metrics import HTTP_REQUEST_SECONDS
+from backend.app.services.status_tracker import status_consumer
 from backend.app.core.config import settings
 
-app = FastAPI(title="Academic Paper Search API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load known paper ids without delaying startup
+    dedup_task = asyncio.create_task(warm_dedup_index())
+    # Follow worker status events for /papers/{id}/status
+    if settings.STATUS_TRACKING_ENABLED:
+        status_consumer.start(asyncio.get_running_loop())
+    yield
+    dedup_task.cancel()
+    status_consumer.stop()
+    # Release pooled connections and executor threads on shutdown
+    await OpenAIHandler.aclose()
+    await services.aclose()
+    # The graph stack is imported by the first graph request, if any
+    graph_builder = sys.modules.get("backend.app.services.graph_builder")
+    if graph_builder is not None:
+        graph_builder.graph_executor.shutdown(wait=False)
+
+app = FastAPI(title="Academic Paper Search API", lifespan=lifespan)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so paper ids do not explode the series count
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", response.status_code
+    ).observe(time.perf_counter() - started)
+    return response
 
 # Include routes
 app.include_router(router)
@@ -15,4 +52,4 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=settings.APP_PORT,
         reload=True
-    )
\ No newline at end of file
+    )
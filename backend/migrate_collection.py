@@ -0,0 +1,288 @@
+# migrate_collection.py
+import argparse
+import time
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from backend.app.core.config import settings
+from backend.app.services.collection_config import (
+    vectors_config, quantization_config, search_params, create_payload_indexes, filter_payload
+)
+
+def truncate(vectors, dim):
+    """Matryoshka truncation: keep the leading dimensions and renormalize"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.shape[1] <= dim:
+        return vectors
+    vectors = vectors[:, :dim]
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+
+def resolve_collection(client, name):
+    """Return the physical collection behind name, following an alias if there is one"""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name
+
+def copy_collection(client, source, target, dim, quantization, page_size):
+    client.create_collection(
+        collection_name=target,
+        vectors_config=vectors_config(dim),
+        quantization_config=quantization_config(quantization)
+    )
+    create_payload_indexes(client, target)
+    offset = None
+    copied = 0
+    while True:
+        page, offset = client.scroll(
+            collection_name=source,
+            limit=page_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if page:
+            vectors = truncate([point.vector for point in page], dim)
+            client.upsert(
+                collection_name=target,
+                points=[
+                    models.PointStruct(id=point.id, vector=vector.tolist(), payload=point.payload)
+                    for point, vector in zip(page, vectors)
+                ]
+            )
+            copied += len(page)
+            print(f"Copied {copied} points")
+        if offset is None:
+            break
+    return copied
+
+def measure_recall(client, source, target, dim, quantization, samples, k):
+    """recall@k of the new layout against exact full-precision search on the source"""
+    probes = client.scroll(
+        collection_name=source,
+        limit=samples,
+        with_payload=False,
+        with_vectors=True
+    )[0]
+    if not probes:
+        return None
+
+    exact_params = models.SearchParams(
+        exact=True,
+        quantization=models.QuantizationSearchParams(ignore=True)
+    )
+    recalls, exact_ms, approx_ms = [], [], []
+    for probe in probes:
+        started = time.perf_counter()
+        exact = client.search(
+            collection_name=source,
+            query_vector=probe.vector,
+            limit=k,
+            search_params=exact_params
+        )
+        exact_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        approx = client.search(
+            collection_name=target,
+            query_vector=truncate([probe.vector], dim)[0].tolist(),
+            limit=k,
+            search_params=search_params(quantization)
+        )
+        approx_ms.append((time.perf_counter() - started) * 1000)
+
+        expected = {point.id for point in exact}
+        recalls.append(len(expected & {point.id for point in approx}) / max(len(expected), 1))
+
+    return {
+        f"recall@{k}": float(np.mean(recalls)),
+        "exact_ms_p50": float(np.percentile(exact_ms, 50)),
+        "new_ms_p50": float(np.percentile(approx_ms, 50)),
+        "samples": len(probes)
+    }
+
+def backfill_payload(client, page_size=256):
+    """Add the normalized filter fields to points stored before they existed"""
+    collection = resolve_collection(client, settings.VECTOR_DB_COLLECTION_NAME)
+    create_payload_indexes(client, collection)
+    offset = None
+    updated = 0
+    while True:
+        page, offset = client.scroll(
+            collection_name=collection,
+            limit=page_size,
+            offset=offset,
+            with_payload=["authors", "published", "link"],
+            with_vectors=False
+        )
+        if page:
+            # One request per page instead of one per point
+            client.batch_update_points(
+                collection_name=collection,
+                update_operations=[
+                    models.SetPayloadOperation(set_payload=models.SetPayload(
+                        payload=filter_payload(point.payload or {}),
+                        points=[point.id]
+                    ))
+                    for point in page
+                ]
+            )
+            updated += len(page)
+            print(f"Backfilled {updated} points")
+        if offset is None:
+            break
+    return updated
+
+def sync_missing(client, source, target, dim, page_size):
+    """Copy the points of source that target lacks, e.g. ones upserted while the copy was scrolling"""
+    offset = None
+    synced = 0
+    while True:
+        page, offset = client.scroll(
+            collection_name=source,
+            limit=page_size,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False
+        )
+        if page:
+            ids = [point.id for point in page]
+            present = {
+                str(point.id) for point in
+                client.retrieve(collection_name=target, ids=ids, with_payload=False, with_vectors=False)
+            }
+            missing = [point_id for point_id in ids if str(point_id) not in present]
+            if missing:
+                points = client.retrieve(collection_name=source, ids=missing, with_payload=True, with_vectors=True)
+                vectors = truncate([point.vector for point in points], dim)
+                client.upsert(
+                    collection_name=target,
+                    points=[
+                        models.PointStruct(id=point.id, vector=vector.tolist(), payload=point.payload)
+                        for point, vector in zip(points, vectors)
+                    ]
+                )
+                synced += len(points)
+        if offset is None:
+            break
+    return synced
+
+def catch_up(client, source, target, dim, page_size, passes=5):
+    """Re-sync until a pass finds nothing missing (ingestion may still be writing to source)"""
+    for _ in range(passes):
+        synced = sync_missing(client, source, target, dim, page_size)
+        print(f"Re-synced {synced} points from {source} to {target}")
+        if not synced:
+            return
+    print(f"{source} is still receiving writes; a final re-sync runs after the swap")
+
+def backup_collection(client, source, dim, page_size):
+    """Copy source, vectors untouched, to a new collection and check every point arrived"""
+    backup = f"{source}_full_{int(time.time())}"
+    copied = copy_collection(client, source, backup, dim, "none", page_size)
+    stored = client.count(collection_name=backup, exact=True).count
+    if stored != client.count(collection_name=source, exact=True).count:
+        raise RuntimeError(f"Backup {backup} holds {stored} of the points in {source}; {source} left in place")
+    print(f"Copied {copied} points from {source} to {backup}")
+    return backup
+
+def migrate(client, dim, quantization, page_size=256, samples=100, k=10, swap=False, delete_source=False,
+            ingestion_paused=False):
+    name = settings.VECTOR_DB_COLLECTION_NAME
+    source = resolve_collection(client, name)
+    current_dim = client.get_collection(source).config.params.vectors.size
+
+    if dim == current_dim:
+        # Same dimension: quantization can be switched in place
+        client.update_collection(
+            collection_name=source,
+            quantization_config=quantization_config(quantization) or models.Disabled.DISABLED
+        )
+        print(f"Set quantization of {source} to {quantization}")
+        print(measure_recall(client, source, source, dim, quantization, samples, k))
+        return source
+
+    if dim > current_dim:
+        raise ValueError(f"Cannot grow vectors from {current_dim} to {dim} dimensions")
+    if swap and source == name and not ingestion_paused:
+        # The collection has to be deleted before an alias can take its name, and
+        # Qdrant cannot do both in one call, so writes in between would be lost
+        raise ValueError(
+            f"{name} is a collection, not an alias: stop the workers and pass --ingestion-paused to swap it"
+        )
+
+    target = f"{name}_d{dim}_{quantization}_{int(time.time())}"
+    copied = copy_collection(client, source, target, dim, quantization, page_size)
+    print(f"Copied {copied} points from {source} ({current_dim}d) to {target} ({dim}d, {quantization})")
+    print(measure_recall(client, source, target, dim, quantization, samples, k))
+
+    if swap:
+        # Papers upserted while the copy was scrolling
+        catch_up(client, source, target, dim, page_size)
+        actions = []
+        previous = source
+        if source == name:
+            # A collection and an alias cannot share a name, so keep the original vectors
+            # under a backup name before the collection makes way for the alias
+            previous = backup_collection(client, source, current_dim, page_size)
+            client.delete_collection(source)
+        else:
+            actions.append(models.DeleteAliasOperation(
+                delete_alias=models.DeleteAlias(alias_name=name)
+            ))
+        # Switched in one call, so the name always resolves to a collection
+        actions.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=target, alias_name=name)
+        ))
+        client.update_collection_aliases(change_aliases_operations=actions)
+        print(f"Alias {name} now points to {target}")
+        if previous == source:
+            # Writes that reached the old collection between the last pass and the swap
+            print(f"Re-synced {sync_missing(client, source, target, dim, page_size)} points after the swap")
+        if delete_source:
+            client.delete_collection(previous)
+            print(f"Deleted previous collection {previous}")
+        else:
+            print(f"Previous collection {previous} kept with the original {current_dim}d vectors for rollback; "
+                  f"delete it with --delete-source or by hand once the new layout is verified")
+    else:
+        print(f"Run again with --swap to point {name} at {target}")
+
+    print(f"Set EMBEDDING_DIM={dim} and VECTOR_QUANTIZATION={quantization} for the API and workers, "
+          f"then rebuild the kNN graph")
+    return target
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Migrate the papers collection to truncated and/or quantized vectors"
+    )
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM,
+                        help="Target vector dimension (Matryoshka truncation)")
+    parser.add_argument("--quantization", choices=["none", "scalar", "binary"],
+                        default=settings.VECTOR_QUANTIZATION)
+    parser.add_argument("--page-size", type=int, default=256)
+    parser.add_argument("--eval-samples", type=int, default=100,
+                        help="Stored papers used as probe queries for the recall check")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--swap", action="store_true",
+                        help="Point the collection name at the new collection when done; "
+                             "the previous collection is kept (copied to a backup name if needed)")
+    parser.add_argument("--delete-source", action="store_true",
+                        help="With --swap, delete the previous collection afterwards")
+    parser.add_argument("--ingestion-paused", action="store_true",
+                        help="Confirm the workers are stopped; required to --swap a collection that is not "
+                             "yet behind an alias")
+    parser.add_argument("--backfill-payload", action="store_true",
+                        help="Only add the indexed filter fields (authors, source, published_at, year) "
+                             "to existing points")
+    args = parser.parse_args()
+    if args.delete_source and not args.swap:
+        parser.error("--delete-source requires --swap")
+
+    client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    if args.backfill_payload:
+        backfill_payload(client, args.page_size)
+    else:
+        migrate(client, args.dim, args.quantization, args.page_size, args.eval_samples, args.k, args.swap,
+                args.delete_source, args.ingestion_paused)
@@ -8,23 +8,31 @@ def setup_partitioned_topic():
             'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS
         })
         
-        # Check if topic exists
+        # Processing topic is partitioned for the workers; status and dead letters are low volume
+        topics = {
+            settings.KAFKA_PROCESSING_TOPIC: settings.KAFKA_NUM_PARTITIONS,  # Adjust based on your needs
+            settings.KAFKA_STATUS_TOPIC: 1,
+            settings.KAFKA_DEAD_LETTER_TOPIC: 1,
+        }
+
+        # Check which topics exist
         metadata = admin_client.list_topics(timeout=10)
-        if settings.KAFKA_PROCESSING_TOPIC not in metadata.topics:
-            # Create topic with multiple partitions
-            topic = NewTopic(
-                settings.KAFKA_PROCESSING_TOPIC,
-                num_partitions=settings.KAFKA_NUM_PARTITIONS,  # Adjust based on your needs
-                replication_factor=1
-            )
-            
-            admin_client.create_topics([topic])
-            print(f"Created topic {settings.KAFKA_PROCESSING_TOPIC} with {settings.KAFKA_NUM_PARTITIONS} partitions")
-        else:
-            print(f"Topic {settings.KAFKA_PROCESSING_TOPIC} already exists")
+        missing = [
+            NewTopic(name, num_partitions=partitions, replication_factor=1)
+            for name, partitions in topics.items()
+            if name not in metadata.topics
+        ]
+        for name in topics:
+            if name in metadata.topics:
+                print(f"Topic {name} already exists")
+
+        if missing:
+            for name, future in admin_client.create_topics(missing).items():
+                future.result()
+                print(f"Created topic {name} with {topics[name]} partitions")
             
     except Exception as e:
         print(f"Error setting up Kafka topic: {str(e)}")
 
 if __name__ == "__main__":
-    setup_partitioned_topic()
\ No newline at end of file
+    setup_partitioned_topic()
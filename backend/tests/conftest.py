@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+# Settings are read at import, so the shared state files must point at a scratch
+# directory before any backend module is loaded
+_state_dir = tempfile.mkdtemp(prefix="paper-search-tests-")
+os.environ.update({
+    "EMBEDDING_MODEL": "fake",
+    "EMBEDDING_RATE_LIMIT_ENABLED": "false",
+    "EMBEDDING_CACHE_PATH": os.path.join(_state_dir, "embeddings.sqlite3"),
+    "RATE_LIMIT_STATE_PATH": os.path.join(_state_dir, "rate_limit"),
+    "INGEST_VERSION_PATH": os.path.join(_state_dir, "ingest_version"),
+    "KNN_GRAPH_PATH": os.path.join(_state_dir, "knn_graph.npz"),
+    "LEXICAL_INDEX_PATH": os.path.join(_state_dir, "lexical_index.npz"),
+    "DEDUP_BLOOM_PATH": os.path.join(_state_dir, "dedup_bloom.bin"),
+    "TRACING_ENABLED": "false",
+    "WORKER_RETRY_BACKOFF_SECONDS": "0",
+    "WORKER_MAX_RETRIES": "1",
+})
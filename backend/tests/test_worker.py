@@ -0,0 +1,148 @@
+import json
+import uuid
+
+import pytest
+from qdrant_client import QdrantClient
+
+from backend import worker as worker_module
+from backend.app.core.config import settings
+from backend.app.services.openai_handler import OpenAIHandler
+from backend.benchmark import InProcessBroker
+
+@pytest.fixture
+def broker():
+    return InProcessBroker()
+
+@pytest.fixture
+def store():
+    return QdrantClient(":memory:")
+
+@pytest.fixture
+def worker(broker, store, monkeypatch):
+    # Stand in for Kafka and Qdrant with the benchmark's in-process broker and local mode
+    monkeypatch.setattr(worker_module, "Consumer", broker.consumer)
+    monkeypatch.setattr(worker_module, "Producer", broker.producer)
+    monkeypatch.setattr(worker_module, "QdrantClient", lambda **kwargs: store)
+    return worker_module.WorkerService(0)
+
+def make_paper(**fields):
+    paper_id = str(uuid.uuid4())
+    return {
+        "paper_id": paper_id,
+        "title": f"Paper {paper_id}",
+        "abstract": "An abstract",
+        "authors": "A. Author",
+        "published": "2024-01-01",
+        "link": f"https://example.org/{paper_id}",
+        **fields
+    }
+
+def enqueue(broker, *papers):
+    return [
+        broker.append(settings.KAFKA_PROCESSING_TOPIC, json.dumps(paper).encode("utf-8"), None, [])
+        for paper in papers
+    ]
+
+def statuses(broker):
+    events = [json.loads(msg.value()) for msg in broker.topics[settings.KAFKA_STATUS_TOPIC]]
+    return {event["paper_id"]: event["status"] for event in events}
+
+def dead_letters(broker):
+    return [msg.value() for msg in broker.topics[settings.KAFKA_DEAD_LETTER_TOPIC]]
+
+def dead_letter_reasons(broker):
+    return [dict(msg.headers())["error"].decode("utf-8") for msg in broker.topics[settings.KAFKA_DEAD_LETTER_TOPIC]]
+
+def test_process_batch_stores_papers(worker, broker, store):
+    papers = [make_paper() for _ in range(3)]
+
+    stored = worker.process_batch(enqueue(broker, *papers))
+
+    assert [paper["paper_id"] for paper in stored] == [paper["paper_id"] for paper in papers]
+    assert store.count(settings.VECTOR_DB_COLLECTION_NAME).count == 3
+    assert statuses(broker) == {paper["paper_id"]: "completed" for paper in papers}
+    assert dead_letters(broker) == []
+
+def test_malformed_message_is_dead_lettered_without_the_batch(worker, broker, store):
+    good = make_paper()
+    bad = make_paper()
+    del bad["link"]
+
+    stored = worker.process_batch(enqueue(broker, good, bad))
+
+    assert [paper["paper_id"] for paper in stored] == [good["paper_id"]]
+    assert store.count(settings.VECTOR_DB_COLLECTION_NAME).count == 1
+    assert dead_letters(broker) == [json.dumps(bad).encode("utf-8")]
+    assert dead_letter_reasons(broker) == ["invalid: missing or non-string fields: link"]
+    assert statuses(broker) == {good["paper_id"]: "completed", bad["paper_id"]: "error"}
+
+def test_undecodable_message_is_dead_lettered(worker, broker, store):
+    good = make_paper()
+    messages = enqueue(broker, good)
+    messages.append(broker.append(settings.KAFKA_PROCESSING_TOPIC, b"{not json", None, []))
+
+    stored = worker.process_batch(messages)
+
+    assert [paper["paper_id"] for paper in stored] == [good["paper_id"]]
+    assert dead_letters(broker) == [b"{not json"]
+    assert dead_letter_reasons(broker)[0].startswith("decode: ")
+    assert statuses(broker) == {good["paper_id"]: "completed"}
+
+def test_embedding_failure_is_isolated_to_the_failing_paper(worker, broker, store, monkeypatch):
+    papers = [make_paper() for _ in range(4)]
+    poison = make_paper(title="poison")
+    generate_embeddings = OpenAIHandler.generate_embeddings
+
+    def embed(texts):
+        if any(text.startswith("poison") for text in texts):
+            raise ValueError("embedding rejected")
+        return generate_embeddings(texts)
+
+    monkeypatch.setattr(OpenAIHandler, "generate_embeddings", staticmethod(embed))
+
+    stored = worker.process_batch(enqueue(broker, papers[0], papers[1], poison, papers[2], papers[3]))
+
+    assert sorted(paper["paper_id"] for paper in stored) == sorted(paper["paper_id"] for paper in papers)
+    assert store.count(settings.VECTOR_DB_COLLECTION_NAME).count == 4
+    assert dead_letters(broker) == [json.dumps(poison).encode("utf-8")]
+    assert dead_letter_reasons(broker) == ["embedding rejected"]
+    assert statuses(broker)[poison["paper_id"]] == "error"
+
+def test_point_build_failure_is_isolated_to_the_failing_paper(worker, broker, store, monkeypatch):
+    good = make_paper()
+    bad = make_paper()
+    build_point = worker._build_point
+
+    def build(paper, embedding):
+        if paper["paper_id"] == bad["paper_id"]:
+            raise KeyError("year")
+        return build_point(paper, embedding)
+
+    monkeypatch.setattr(worker, "_build_point", build)
+
+    stored = worker.process_batch(enqueue(broker, good, bad))
+
+    assert [paper["paper_id"] for paper in stored] == [good["paper_id"]]
+    assert dead_letters(broker) == [json.dumps(bad).encode("utf-8")]
+    assert statuses(broker) == {good["paper_id"]: "completed", bad["paper_id"]: "error"}
+
+def test_bisect_returns_succeeding_chunks_and_failing_items(worker):
+    calls = []
+
+    def func(items):
+        calls.append(list(items))
+        if 3 in items or 6 in items:
+            raise ValueError("bad item")
+        return sum(items)
+
+    done, failed = worker._bisect("test", func, list(range(8)), retries=0)
+
+    assert sorted(item for chunk, _ in done for item in chunk) == [0, 1, 2, 4, 5, 7]
+    assert all(result == sum(chunk) for chunk, result in done)
+    assert [(item, str(error)) for item, error in failed] == [(3, "bad item"), (6, "bad item")]
+
+def test_bisect_does_not_split_a_batch_that_succeeds(worker):
+    done, failed = worker._bisect("test", sum, [1, 2, 3], retries=0)
+
+    assert done == [([1, 2, 3], 6)]
+    assert failed == []
@@ -1,11 +1,29 @@
-from confluent_kafka import Consumer, Producer
+from confluent_kafka import Consumer, Producer, TopicPartition
 import multiprocessing
 import json
+import random
+import sys
+import time
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 
 from backend.app.core.config import settings
 from backend.app.services.openai_handler import OpenAIHandler
+from backend.app.services.knn_graph import knn_graph
+from backend.app.services.lexical_index import lexical_index
+from backend.app.services.collection_config import (
+    vectors_config, quantization_config, create_payload_indexes, filter_payload
+)
+from backend.app.services.dedup_index import new_dedup_index
+from backend.app.services.tracing import BatchTrace, trace_headers
+from backend.app.services.query_cache import ingest_version
+from backend.app.services.metrics import (
+    CONSUMER_LAG, WORKER_BATCH_SECONDS, WORKER_BATCH_SIZE, WORKER_DEAD_LETTERS,
+    WORKER_FAILURES, WORKER_MESSAGES, WORKER_PAPERS, TimedQdrant, start_metrics_server
+)
+
+# Fields _build_point and _texts read from every paper message
+REQUIRED_FIELDS = ("paper_id", "title", "abstract", "published", "link")
 
 class WorkerService:
 
@@ -16,6 +34,7 @@ class WorkerService:
             'group.id': 'paper_processing_group',
             'auto.offset.reset': 'earliest',
             'partition.assignment.strategy': 'roundrobin',
+            'enable.auto.commit': False,
         })
         
         self.consumer.subscribe(
@@ -24,19 +43,27 @@ class WorkerService:
             on_revoke=self._on_revoke
         )
 
-        #Initialize Kafka producer for status updates
-        # self.producer = Producer({
-        #     'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS
-        # })
+        # Initialize Kafka producer for status updates and dead letters
+        self.producer = Producer({
+            'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS,
+            'linger.ms': settings.KAFKA_PRODUCER_LINGER_MS,
+            'compression.type': settings.KAFKA_PRODUCER_COMPRESSION
+        })
         
         self.openai_handler = OpenAIHandler()
-        self.qdrant = QdrantClient(
+        self.qdrant = TimedQdrant(QdrantClient(
             host=settings.QDRANT_HOST,
             port=settings.QDRANT_PORT
-        )
+        ))
 
         self.initialize_collection()
 
+        # Shared with the API and the other workers; only the first process to start fills it
+        self.dedup_index = new_dedup_index()
+        self.dedup_index.load(self.qdrant)
+        self._coverage_checked_at = float("-inf")
+        self._negatives_trusted = False
+
     def _on_assign(self, consumer, partitions):
         partition_info = [f"{p.topic}-{p.partition}" for p in partitions]
         print(f"Worker {self.worker_id} assigned partitions: {partition_info}")
@@ -44,6 +71,11 @@ class WorkerService:
     def _on_revoke(self, consumer, partitions):
         partition_info = [f"{p.topic}-{p.partition}" for p in partitions]
         print(f"Worker {self.worker_id} lost partitions: {partition_info}")
+        for p in partitions:
+            try:
+                CONSUMER_LAG.remove(p.topic, str(p.partition))
+            except KeyError:
+                pass
 
     def initialize_collection(self):
         """Initialize Qdrant collection for papers"""
@@ -52,106 +84,440 @@ class WorkerService:
         except:
             self.qdrant.create_collection(
                 collection_name=settings.VECTOR_DB_COLLECTION_NAME,
-                vectors_config=models.VectorParams(
-                    size=settings.EMBEDDING_DIM,  # OpenAI embedding dimension
-                    distance=models.Distance.COSINE
-                )
+                vectors_config=vectors_config(),
+                quantization_config=quantization_config()
             )
+        create_payload_indexes(self.qdrant, settings.VECTOR_DB_COLLECTION_NAME)
 
     def delivery_report(self, err, msg):
         """Callback for producer message delivery"""
         if err is not None:
             print(f'Message delivery failed: {err}')
-        else:
-            print(f'Message delivered to {msg.topic()} [{msg.partition()}]')
+
+    def _drain_batch(self):
+        """Collect up to WORKER_BATCH_SIZE messages or until the linger time expires"""
+        batch = []
+        deadline = time.monotonic() + settings.WORKER_BATCH_LINGER_MS / 1000
+        while len(batch) < settings.WORKER_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            msgs = self.consumer.consume(
+                num_messages=settings.WORKER_BATCH_SIZE - len(batch),
+                timeout=remaining
+            )
+            for msg in msgs:
+                if msg.error():
+                    print(f'Consumer error: {msg.error()}')
+                    continue
+                batch.append(msg)
+        return batch
+
+    def _build_point(self, paper_data, embedding):
+        """Build the Qdrant point for a parsed paper message"""
+        return models.PointStruct(
+            id=paper_data['paper_id'],
+            vector=embedding,
+            payload={
+                "paper_id": paper_data['paper_id'],
+                "title": paper_data["title"],
+                "abstract": paper_data["abstract"],
+                "published": paper_data["published"],
+                "link": paper_data["link"],
+                # authors, source, published_at and year are indexed for filtering
+                **filter_payload(paper_data)
+            }
+        )
+
+    def _with_retry(self, description, func, *args, retries=None, **kwargs):
+        """Call func, retrying with capped exponential backoff and full jitter"""
+        retries = settings.WORKER_MAX_RETRIES if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                WORKER_FAILURES.labels(description).inc()
+                attempt += 1
+                if attempt > retries:
+                    raise
+                delay = random.uniform(0, min(
+                    settings.WORKER_RETRY_MAX_BACKOFF_SECONDS,
+                    settings.WORKER_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                ))
+                print(
+                    f"Worker {self.worker_id} {description} failed "
+                    f"(attempt {attempt}/{retries}): {str(e)}; retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    def _bisect(self, description, func, items, retries=None):
+        """Call func(items) with retries; if it still fails, split the items and try each half.
+
+        Halves get a single retry and are split again down to single items, so
+        only the items that fail on their own are given up on. Returns the
+        (items, result) chunks that succeeded and the (item, error) pairs that
+        did not.
+        """
+        try:
+            return [(items, self._with_retry(description, func, items, retries=retries))], []
+        except Exception as e:
+            if len(items) == 1:
+                return [], [(items[0], e)]
+            print(f"Worker {self.worker_id} {description} of {len(items)} items failed, splitting: {str(e)}")
+            middle = len(items) // 2
+            done, failed = self._bisect(description, func, items[:middle], retries=1)
+            more_done, more_failed = self._bisect(description, func, items[middle:], retries=1)
+            return done + more_done, failed + more_failed
+
+    def _send_status(self, paper_id, status, error=None):
+        status_update = {
+            'paper_id': paper_id,
+            'status': status,
+            'updated_at': time.time()
+        }
+        if error is not None:
+            status_update['error'] = error
+        WORKER_PAPERS.labels(status).inc()
+        self.producer.produce(
+            settings.KAFKA_STATUS_TOPIC,
+            json.dumps(status_update).encode('utf-8'),
+            key=str(paper_id).encode('utf-8'),
+            callback=self.delivery_report
+        )
+
+    def _dead_letter(self, msg, reason):
+        """Park the original message on the dead-letter topic with why it failed"""
+        WORKER_DEAD_LETTERS.inc()
+        self.producer.produce(
+            settings.KAFKA_DEAD_LETTER_TOPIC,
+            msg.value(),
+            key=msg.key(),
+            headers=[
+                ('error', reason.encode('utf-8')),
+                ('source_topic', msg.topic().encode('utf-8')),
+                ('source_partition', str(msg.partition()).encode('utf-8')),
+                ('source_offset', str(msg.offset()).encode('utf-8')),
+                ('failed_at', str(time.time()).encode('utf-8')),
+                *trace_headers(msg)
+            ],
+            callback=self.delivery_report
+        )
+
+    def _trust_negatives(self):
+        """Whether bloom negatives may skip the Qdrant lookup, rechecked every DEDUP_COVERAGE_CHECK_SECONDS.
+
+        Points written without passing through the filter (a restored or
+        migrated collection) leave it with fewer ids than the collection; it is
+        then reloaded, and every id is looked up in Qdrant until it covers the
+        collection again.
+        """
+        now = time.monotonic()
+        if now - self._coverage_checked_at < settings.DEDUP_COVERAGE_CHECK_SECONDS:
+            return self._negatives_trusted
+        self._coverage_checked_at = now
+        try:
+            points_count = self.qdrant.get_collection(settings.VECTOR_DB_COLLECTION_NAME).points_count
+            self._negatives_trusted = self.dedup_index.covers(points_count)
+            if not self._negatives_trusted:
+                print(
+                    f"Worker {self.worker_id} dedup index has {self.dedup_index.size} ids "
+                    f"for {points_count} points; reloading"
+                )
+                self.dedup_index.load(self.qdrant, force=True)
+        except Exception as e:
+            print(f"Worker {self.worker_id} could not check dedup index coverage: {str(e)}")
+            self._negatives_trusted = False
+        return self._negatives_trusted
+
+    def _drop_duplicates(self, papers):
+        """Drop papers already stored (or repeated in this batch) before any embedding work.
+
+        Returns the papers to embed and the ones found already stored in Qdrant.
+        """
+        unique = {}
+        for paper in papers:
+            unique.setdefault(str(paper['paper_id']), paper)
+
+        # Repeats within the batch share the paper id, so they are simply dropped
+        trusted = self._trust_negatives()
+        candidates = [
+            paper_id for paper_id in unique
+            if not trusted or self.dedup_index.might_contain(paper_id)
+        ]
+        duplicates = []
+        if candidates:
+            existing = self._with_retry(
+                "duplicate lookup",
+                self.qdrant.retrieve,
+                collection_name=settings.VECTOR_DB_COLLECTION_NAME,
+                ids=candidates,
+                with_payload=False,
+                with_vectors=False
+            )
+            for point in existing:
+                duplicates.append(unique.pop(str(point.id)))
+
+        skipped = len(papers) - len(unique)
+        if skipped:
+            print(f"Worker {self.worker_id} skipped {skipped} duplicate papers")
+        return list(unique.values()), duplicates
+
+    def _commit(self, messages):
+        # Status and dead-letter messages must be durable before their inputs are committed
+        self.producer.flush()
+        self.consumer.commit(
+            offsets=[
+                TopicPartition(msg.topic(), msg.partition(), msg.offset() + 1)
+                for msg in messages
+            ],
+            asynchronous=False
+        )
+
+    def _update_lag(self):
+        """Publish how far each assigned partition is behind its high watermark"""
+        try:
+            for p in self.consumer.position(self.consumer.assignment()):
+                _, high = self.consumer.get_watermark_offsets(p, cached=True)
+                if p.offset >= 0 and high >= 0:
+                    CONSUMER_LAG.labels(p.topic, str(p.partition)).set(high - p.offset)
+        except Exception as e:
+            print(f"Worker {self.worker_id} could not read consumer lag: {str(e)}")
+
+    def _rewind(self, messages):
+        """Seek back to the first uncommitted message of each partition so the batch is redelivered"""
+        first = {}
+        for msg in messages:
+            key = (msg.topic(), msg.partition())
+            first[key] = min(first.get(key, msg.offset()), msg.offset())
+        for (topic, partition), offset in first.items():
+            self.consumer.seek(TopicPartition(topic, partition, offset))
+
+    def _prepare(self, messages):
+        """Decode a batch, dead-letter what cannot be parsed and drop duplicates.
+
+        Returns the papers still to embed and a map of paper id to source message.
+        """
+        papers = []
+        sources = {}
+        for msg in messages:
+            try:
+                paper = json.loads(msg.value().decode('utf-8'))
+            except Exception as e:
+                print(f"Error decoding message at {msg.topic()}[{msg.partition()}]@{msg.offset()}: {str(e)}")
+                self._dead_letter(msg, f"decode: {str(e)}")
+                continue
+            problem = self._invalid(paper)
+            if problem:
+                print(f"Invalid message at {msg.topic()}[{msg.partition()}]@{msg.offset()}: {problem}")
+                self._dead_letter(msg, f"invalid: {problem}")
+                if isinstance(paper, dict) and paper.get('paper_id'):
+                    self._send_status(paper['paper_id'], 'error', problem)
+                continue
+            sources[str(paper['paper_id'])] = msg
+            papers.append(paper)
+
+        papers, duplicates = self._drop_duplicates(papers)
+        for paper in duplicates:
+            self._send_status(paper['paper_id'], 'duplicate')
+        return papers, sources
+
+    @staticmethod
+    def _invalid(paper):
+        """Why a decoded message cannot be stored, or None if it can"""
+        if not isinstance(paper, dict):
+            return "not a JSON object"
+        missing = [field for field in REQUIRED_FIELDS if not isinstance(paper.get(field), str)]
+        if missing:
+            return f"missing or non-string fields: {', '.join(missing)}"
+        return None
+
+    @staticmethod
+    def _texts(papers):
+        # Combine title and abstract for embedding
+        return [f"{paper['title']} {paper['abstract']}" for paper in papers]
+
+    def _fail(self, papers, sources, error):
+        print(f"Error processing {len(papers)} papers: {str(error)}")
+        for paper in papers:
+            self._dead_letter(sources[str(paper['paper_id'])], str(error))
+            self._send_status(paper['paper_id'], 'error', str(error))
+
+    def _build_points(self, embedded):
+        """Points for the (papers, embeddings) chunks that embedded, and the (paper, error) pairs that did not build"""
+        points, failed = [], []
+        for chunk, embeddings in embedded:
+            for paper, embedding in zip(chunk, embeddings):
+                try:
+                    points.append(self._build_point(paper, embedding))
+                except Exception as e:
+                    failed.append((paper, e))
+        return points, failed
+
+    def _store(self, papers, trace):
+        """Embed and upsert papers, isolating the ones that keep failing.
+
+        Returns the stored papers, their points and the (paper, error) pairs
+        that failed even on their own.
+        """
+        with trace.span("embed", papers=len(papers)):
+            embedded, failed = self._bisect(
+                "embedding", lambda chunk: OpenAIHandler.generate_embeddings(self._texts(chunk)), papers
+            )
+        points, unbuilt = self._build_points(embedded)
+        failed += unbuilt
+        if not points:
+            return [], [], failed
+
+        with trace.span("upsert", points=len(points)):
+            upserted, upsert_failed = self._bisect(
+                "upsert",
+                lambda chunk: self.qdrant.upsert(collection_name=settings.VECTOR_DB_COLLECTION_NAME, points=chunk),
+                points
+            )
+        by_id = {str(paper['paper_id']): paper for paper in papers}
+        stored_points = [point for chunk, _ in upserted for point in chunk]
+        stored = [by_id[str(point.id)] for point in stored_points]
+        failed += [(by_id[str(point.id)], error) for point, error in upsert_failed]
+        return stored, stored_points, failed
+
+    def _after_upsert(self, stored, points):
+        """Bookkeeping once papers are in Qdrant: dedup index, caches, kNN graph, lexical index and status"""
+        self.dedup_index.add(paper['paper_id'] for paper in stored)
+
+        # Patch the precomputed similarity graph with the new papers
+        try:
+            knn_graph.add_points(self.qdrant, points)
+        except Exception as e:
+            print(f"Error updating kNN graph: {str(e)}")
+
+        # Keep keyword search in step with the vector index
+        try:
+            lexical_index.add_papers(stored)
+        except Exception as e:
+            print(f"Error updating lexical index: {str(e)}")
+
+        # Invalidate cached API search results, once every index a search reads includes the papers
+        ingest_version.bump()
+
+        # Send success status
+        for paper in stored:
+            self._send_status(paper['paper_id'], 'completed')
+
+    def process_batch(self, messages):
+        """Embed and store a batch of paper messages, then commit their offsets.
+
+        Messages that cannot be decoded go to the dead-letter topic. When a
+        batched embedding or upsert still fails after WORKER_MAX_RETRIES, the
+        batch is split until the failing papers are isolated, and only those
+        are dead-lettered. Offsets are only committed once every message is
+        either stored or dead-lettered.
+        """
+        trace = BatchTrace(self.worker_id, messages)
+        WORKER_MESSAGES.inc(len(messages))
+        WORKER_BATCH_SIZE.observe(len(messages))
+
+        with trace.span("decode"):
+            papers, sources = self._prepare(messages)
+
+        stored = []
+        if papers:
+            # One embedding request and one upsert for the whole batch, unless a paper keeps failing
+            stored, points, failed = self._store(papers, trace)
+            trace.papers(stored, sources, "completed")
+            for paper, error in failed:
+                self._fail([paper], sources, error)
+            trace.papers([paper for paper, _ in failed], sources, "error")
+
+        if stored:
+            with trace.span("index"):
+                self._after_upsert(stored, points)
+
+        with trace.span("commit"):
+            self._commit(messages)
+        self._update_lag()
+
+        elapsed = time.perf_counter() - trace.started
+        WORKER_BATCH_SECONDS.observe(elapsed)
+        trace.finish(stored=len(stored))
+        rate = len(stored) / elapsed if elapsed > 0 else 0.0
+        print(
+            f"Worker {self.worker_id} processed batch of {len(stored)} papers "
+            f"in {elapsed:.2f}s ({rate:.1f} papers/s)"
+        )
+        return stored
 
     def process_papers(self):
-        """Process papers from Kafka and store in Qdrant"""
+        """Process papers from Kafka in micro-batches and store in Qdrant"""
         try:
             print("Starting paper processing worker...")
             while True:
-                msg = self.consumer.poll(0.5)
-
-                if msg is None:
+                messages = self._drain_batch()
+                if not messages:
+                    self.producer.poll(0)
                     continue
-                if msg.error():
-                    print(f'Consumer error: {msg.error()}')
-                    continue
-                
-                print(f"Processing message from partition {msg.partition()}")
+
                 try:
-                    # Parse message
-                    paper_data = json.loads(msg.value().decode('utf-8'))
-                    paper_id = paper_data['paper_id']
-                    
-                    print(f"Processing paper: {paper_id}")
-                    
-                    # Combine title and abstract for embedding
-                    full_text = f"{paper_data['title']} {paper_data['abstract']}"
-                    
-                    # Generate embedding
-                    embedding = OpenAIHandler.generate_embedding(full_text)
-                    
-                    # Store in Qdrant
-                    self.qdrant.upsert(
-                        collection_name=settings.VECTOR_DB_COLLECTION_NAME,
-                        points=[
-                            models.PointStruct(
-                                id=paper_id,
-                                vector=embedding,
-                                payload={
-                                    "paper_id": paper_id,
-                                    "title": paper_data["title"],
-                                    "authors": paper_data["authors"].split(","),
-                                    "abstract": paper_data["abstract"],
-                                    "published": paper_data["published"],
-                                    "link": paper_data["link"]
-                                }
-                            )
-                        ]
-                    )
-                    
-                    # Send success status
-                    status_update = {
-                        'paper_id': paper_id,
-                        'status': 'completed'
-                    }
-                    # self.producer.produce(
-                    #     settings.KAFKA_STATUS_TOPIC,
-                    #     json.dumps(status_update).encode('utf-8'),
-                    #     callback=self.delivery_report
-                    # )
-                    # self.producer.poll(0)
-                    
-                    print(f"Successfully processed paper: {paper_id}")
-                    
+                    self.process_batch(messages)
                 except Exception as e:
-                    print(f"Error processing paper: {str(e)}")
-                    if 'paper_id' in locals():
-                        status_update = {
-                            'paper_id': paper_id,
-                            'status': 'error',
-                            'error': str(e)
-                        }
-                        # self.producer.produce(
-                        #     settings.KAFKA_STATUS_TOPIC,
-                        #     json.dumps(status_update).encode('utf-8'),
-                        #     callback=self.delivery_report
-                        # )
-                        # self.producer.poll(0)
+                    # Nothing was committed, so replay the batch instead of skipping it
+                    print(f"Error processing batch, rewinding: {str(e)}")
+                    self._rewind(messages)
 
         except KeyboardInterrupt:
             print("Shutting down...")
         finally:
             self.consumer.close()
-            # self.producer.flush()
+            self.producer.flush()
+
+def replay_dead_letters(limit=None):
+    """Move messages from the dead-letter topic back onto the processing topic"""
+    consumer = Consumer({
+        'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS,
+        'group.id': 'paper_dead_letter_replay',
+        'auto.offset.reset': 'earliest',
+        'enable.auto.commit': False,
+    })
+    producer = Producer({'bootstrap.servers': settings.KAFKA_BOOTSTRAP_SERVERS})
+    consumer.subscribe([settings.KAFKA_DEAD_LETTER_TOPIC])
+    replayed = 0
+    try:
+        while limit is None or replayed < limit:
+            msg = consumer.poll(5.0)
+            if msg is None:
+                break
+            if msg.error():
+                print(f'Consumer error: {msg.error()}')
+                continue
+            # Keep the original trace so its ingest span covers the whole detour
+            producer.produce(
+                settings.KAFKA_PROCESSING_TOPIC, msg.value(), key=msg.key(), headers=trace_headers(msg)
+            )
+            producer.flush()
+            consumer.commit(message=msg, asynchronous=False)
+            replayed += 1
+    finally:
+        consumer.close()
+    print(f"Replayed {replayed} dead-lettered papers")
 
 def run_worker(worker_id):
     """Function to create and run a worker"""
+    if settings.WORKER_METRICS_PORT:
+        start_metrics_server(settings.WORKER_METRICS_PORT + worker_id)
     worker = WorkerService(worker_id)
     worker.process_papers()
 
 if __name__ == "__main__":
+    if "--replay-dlq" in sys.argv:
+        replay_dead_letters()
+        sys.exit(0)
+
+    if settings.WORKER_MODE == "async" or "--async" in sys.argv:
+        from backend.async_worker import AsyncWorkerService
+        start_metrics_server(settings.WORKER_METRICS_PORT)
+        AsyncWorkerService().process_papers()
+        sys.exit(0)
+
     num_workers = settings.KAFKA_NUM_PARTITIONS
     
     processes = []
@@ -2,7 +2,7 @@ import requests
 from typing import Dict, List
 import streamlit as st
 
-from core.config import API_URL
+from core.config import API_URL, NEIGHBORS_MAX_EXCLUDE
 
 class PaperAPIClient:
     def __init__(self):
@@ -20,6 +20,21 @@ class PaperAPIClient:
             st.error(f"Error adding paper: {str(e)}")
             return None
 
+    def get_paper_status(self, paper_id: str, wait: float = 0) -> Dict:
+        """Ingestion status of a submitted paper, optionally waiting until it is final"""
+        try:
+            response = requests.get(
+                f"{self.api_url}/papers/{paper_id}/status",
+                params={"wait": wait},
+                timeout=wait + 10
+            )
+            if response.status_code == 404:
+                return None
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error checking paper status: {str(e)}")
+            return None
+
     def search_papers(self, query: str, limit: int = 10) -> List[Dict]:
         """Search papers using backend API"""
         try:
@@ -32,10 +47,34 @@ class PaperAPIClient:
             st.error(f"Error searching papers: {str(e)}")
             return []
 
+    def search_papers_batch(self, queries: List[str], limit: int = 10) -> List[List[Dict]]:
+        """Search several queries in one request; results are aligned with queries"""
+        try:
+            response = requests.post(
+                f"{self.api_url}/query_batch",
+                json={"queries": [{"query_text": query, "top_k": limit} for query in queries]}
+            )
+            return response.json()["results"]
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error searching papers: {str(e)}")
+            return [[] for _ in queries]
+
+    def get_neighbors(self, paper_id: str, limit: int = 5, exclude: List[str] = None) -> List[Dict]:
+        """Papers similar to a stored paper, found from its stored vector"""
+        try:
+            response = requests.get(
+                f"{self.api_url}/papers/{paper_id}/neighbors",
+                params={"limit": limit, "exclude": (exclude or [])[:NEIGHBORS_MAX_EXCLUDE]}
+            )
+            return response.json()["results"]
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error expanding paper: {str(e)}")
+            return []
+
     def check_api_status(self) -> bool:
         """Check if API is accessible"""
         try:
-            response = requests.get(f"{self.api_url}/docs")
+            response = requests.get(f"{self.api_url}/health")
             return response.status_code == 200
         except:
             return False
\ No newline at end of file
@@ -48,25 +48,47 @@ class PaperSearchApp:
 
         return {"nodes": nodes, "edges": edges}
 
-    def get_expanded_nodes(self, node_id):
-        """Generate related nodes with detailed information"""
-        search_results = self.api_client.search_papers(node_id, limit=5)
-        nodes = []
-
-        for i, paper_details in enumerate(search_results):
-            new_id = paper_details["title"]
-            nodes.append({
-                "id": node_id,
-                "label": f"Related {i}",
-                "details": paper_details
-            })
-            st.session_state.node_details[new_id] = paper_details
+    def _frontier(self, node_id):
+        """Paper ids already linked to a node: the ones its expansion would otherwise repeat"""
+        graph = st.session_state.graph
+        neighbors = graph.neighbors(node_id) if node_id in graph else []
+        return [
+            st.session_state.node_details[neighbor]["paper_id"] for neighbor in neighbors
+            if "paper_id" in st.session_state.node_details.get(neighbor, {})
+        ]
 
-        edges = [
-            {"from": node_id, "to": paper_details["title"],
-            "weight": paper_details["similarity"]} 
-            for paper_details in search_results
+    def get_expanded_nodes(self, node_ids):
+        """Generate related nodes with detailed information for several nodes at once"""
+        # Stored papers expand from their stored vectors; anything else falls back to text search
+        paper_ids = {
+            node_id: st.session_state.node_details.get(node_id, {}).get("paper_id")
+            for node_id in node_ids
+        }
+        by_text = [node_id for node_id in node_ids if not paper_ids[node_id]]
+        text_results = dict(zip(by_text, self.api_client.search_papers_batch(by_text, limit=5))) if by_text else {}
+        batch_results = [
+            self.api_client.get_neighbors(paper_ids[node_id], limit=5, exclude=self._frontier(node_id))
+            if paper_ids[node_id] else text_results[node_id]
+            for node_id in node_ids
         ]
+        nodes = []
+        edges = []
+
+        for node_id, search_results in zip(node_ids, batch_results):
+            for i, paper_details in enumerate(search_results):
+                new_id = paper_details["title"]
+                nodes.append({
+                    "id": node_id,
+                    "label": f"Related {i}",
+                    "details": paper_details
+                })
+                st.session_state.node_details[new_id] = paper_details
+
+            edges.extend(
+                {"from": node_id, "to": paper_details["title"],
+                "weight": paper_details["similarity"]} 
+                for paper_details in search_results
+            )
 
         return {"nodes": nodes, "edges": edges}
 
@@ -113,13 +135,13 @@ class PaperSearchApp:
             if unexpanded:
                 col1, col2 = st.columns([3, 1])
                 with col1:
-                    node_to_expand = st.selectbox(
-                        "Select node to expand:",
+                    nodes_to_expand = st.multiselect(
+                        "Select nodes to expand:",
                         unexpanded
                     )
                 with col2:
-                    if st.button("Expand"):
-                        expansion = self.get_expanded_nodes(node_to_expand)
+                    if st.button("Expand") and nodes_to_expand:
+                        expansion = self.get_expanded_nodes(nodes_to_expand)
                         
                         # Add new nodes and edges
                         for node in expansion["nodes"]:
@@ -131,7 +153,7 @@ class PaperSearchApp:
                                 weight=edge["weight"]
                             )
                         
-                        st.session_state.expanded_nodes.add(node_to_expand)
+                        st.session_state.expanded_nodes.update(nodes_to_expand)
 
         self.network_graph.create_network()
 
@@ -2,6 +2,10 @@
 # API_URL = "http://localhost:7890"
 # API_URL = "http://host.docker.internal:7890"
 API_URL="http://backend:7890"
+# Matches the API's NEIGHBORS_MAX_EXCLUDE
+NEIGHBORS_MAX_EXCLUDE = 200
+# How long the submission form waits for ingestion; the API caps it at STATUS_WAIT_MAX_SECONDS
+STATUS_WAIT_SECONDS = 30
 
 # Graph Visualization Settings
 GRAPH_OPTIONS = {
@@ -1,4 +1,6 @@
 import streamlit as st
+
+from core.config import STATUS_WAIT_SECONDS
 # from utils.visualization import NetworkVisualizer
 
 class PaperSubmissionForm:
@@ -16,9 +18,29 @@ class PaperSubmissionForm:
             if submitted and title and abstract:
                 with st.spinner("Adding paper..."):
                     result = self.api_client.add_paper(title, abstract)
-                    if result:
-                        st.success(f"Paper added successfully! ID: {result['paper_id']}")
-                        st.balloons()
+                if not result:
+                    return
+                if "paper_id" not in result:
+                    st.error(f"Error adding paper: {result.get('detail')}")
+                    return
+                if result.get("status") == "duplicate":
+                    st.info(f"Paper already stored. ID: {result['paper_id']}")
+                    return
+                # Long-poll until the worker reports a final status
+                with st.spinner("Indexing paper..."):
+                    status = self.api_client.get_paper_status(result["paper_id"], wait=STATUS_WAIT_SECONDS)
+                self.show_status(result["paper_id"], status)
+
+    def show_status(self, paper_id, status):
+        if status is None or status["status"] == "processing":
+            st.info(f"Paper submitted and still being indexed. ID: {paper_id}")
+        elif status["status"] == "completed":
+            st.success(f"Paper added successfully! ID: {paper_id}")
+            st.balloons()
+        elif status["status"] == "duplicate":
+            st.info(f"Paper already stored. ID: {paper_id}")
+        else:
+            st.error(f"Paper could not be indexed: {status.get('error') or 'unknown error'}")
 
 # class PaperSearchInterface:
 #     def __init__(self, api_client, graph_manager):
@@ -1,14 +1,15 @@
 import os
+import sys
 import json
-import pandas as pd
-from datetime import datetime
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 def extract_fields_from_json(json_file_path):
     """
-    Extract specific fields from the JSON file and convert them into a flat columnar DataFrame.
+    Extract specific fields from the JSON file and convert them into a flat record.
     
     :param json_file_path: Path to the JSON file.
-    :return: Pandas DataFrame with extracted fields.
+    :return: Dictionary with extracted fields.
     """
     with open(json_file_path, 'r', encoding='utf-8') as file:
         data = json.load(file)
@@ -79,40 +80,217 @@ def extract_fields_from_json(json_file_path):
     
     return record
 
-def json_files_to_dataframe(json_file_paths, directory):
-    list_scopus_data = []    
-    for json_file_path in json_file_paths:
-        full_file_path = directory + "\\" + json_file_path
-        print(full_file_path)
-        list_scopus_data.append(extract_fields_from_json(full_file_path))
+def iter_json_files(directory):
+    """
+    Lazily walk a directory tree and yield file paths relative to it.
+    
+    :param directory: The directory to crawl.
+    :return: Generator of relative file paths, in a stable order.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith('.json'):
+                yield os.path.relpath(os.path.join(root, file), directory)
+
 
-    return list_scopus_data
+def parse_file(args):
+    """
+    Worker entry point: parse one file and return (relative path, record, error).
+    """
+    directory, relative_path = args
+    try:
+        return relative_path, extract_fields_from_json(os.path.join(directory, relative_path)), None
+    except Exception as e:
+        return relative_path, None, str(e)
 
 
-def get_all_file_paths(directory):
+def iter_records(directory, skip, workers, max_in_flight):
     """
-    Crawls through a directory and its subdirectories to collect all file paths.
+    Parse files in a process pool, keeping at most max_in_flight files queued so
+    memory stays flat however large the tree is. Results arrive as they finish.
     
-    :param directory: The directory to crawl.
-    :return: A list of file paths relative to the given directory.
+    :param directory: Root directory of the Scopus JSON files.
+    :param skip: Set of relative paths already processed (from the checkpoint).
+    :param workers: Number of parser processes.
+    :param max_in_flight: Upper bound on submitted but unfinished files.
+    :return: Generator of (relative path, record, error) tuples.
+    """
+    paths = (path for path in iter_json_files(directory) if path not in skip)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for path in paths:
+            in_flight.add(pool.submit(parse_file, (directory, path)))
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in in_flight:
+            yield future.result()
+
+
+def record_to_paper(record):
     """
-    file_paths = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            # Construct the relative file path
-            relative_path = os.path.relpath(os.path.join(root, file), directory)
-            file_paths.append(relative_path)
-    return file_paths
-
-
-# Collect file path and store into a list
-target_directory = os.path.abspath("..\\Project")
-file_paths = get_all_file_paths(target_directory)
-
-# Transform json to df
-list_scopus_data = json_files_to_dataframe(file_paths, target_directory)
-df = pd.DataFrame(list_scopus_data)
-
-# Save df to csv file
-output_csv_path = 'output.csv'
-df.to_csv(output_csv_path, index=False)
\ No newline at end of file
+    Map an extracted Scopus record onto the backend Paper schema.
+    
+    :param record: Dictionary returned by extract_fields_from_json.
+    :return: Paper dictionary, or None if the record has no usable title.
+    """
+    title = record['title'] if record['title'] != 'No Data' else ''
+    if not title:
+        return None
+    abstract = record['abstracts'] if isinstance(record['abstracts'], str) else json.dumps(record['abstracts'])
+    date_sort = record['date_sort']
+    doi = record['prism_doi'] if record['prism_doi'] != 'No Data' else ''
+    return {
+        'title': title,
+        'abstract': '' if abstract == 'No Data' else abstract,
+        'authors': ', '.join(name.strip() for name in record['author_names']),
+        'published': f"{date_sort[:4]}-{date_sort[4:6]}-{date_sort[6:8]}",
+        'link': f"https://doi.org/{doi}" if doi else ''
+    }
+
+
+class NdjsonWriter:
+    """Append records as one JSON object per line."""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, records):
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Write records in row groups; a resumed run writes a new part file next to the first."""
+
+    LIST_COLUMNS = ('affiliation_names', 'subject_abbrev', 'author_names')
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        stem, ext = os.path.splitext(path)
+        part = 0
+        while os.path.exists(path):
+            part += 1
+            path = f"{stem}-{part}{ext}"
+        self.pa = pa
+        self.schema = pa.schema([
+            (name, pa.list_(pa.string()) if name in self.LIST_COLUMNS else pa.string())
+            for name in ('date_sort', 'abstracts', 'ref_count', 'affiliation_names', 'prism_doi',
+                         'publisher', 'publication_name', 'title', 'subject_abbrev', 'author_names')
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records):
+        columns = {
+            name: [
+                [str(v) for v in record[name]] if name in self.LIST_COLUMNS
+                else (record[name] if isinstance(record[name], str) else json.dumps(record[name]))
+                for record in records
+            ]
+            for name in self.schema.names
+        }
+        self.writer.write_table(self.pa.table(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ApiWriter:
+    """Send records straight into the ingestion pipeline through /add_papers."""
+
+    def __init__(self, api_url):
+        import requests
+
+        self.session = requests.Session()
+        self.url = f"{api_url.rstrip('/')}/add_papers"
+
+    def write(self, records):
+        papers = [paper for paper in map(record_to_paper, records) if paper is not None]
+        if not papers:
+            return
+        body = '\n'.join(json.dumps(paper, ensure_ascii=False) for paper in papers).encode('utf-8')
+        response = self.session.post(self.url, data=body, headers={'Content-Type': 'application/x-ndjson'})
+        response.raise_for_status()
+        result = response.json()
+        print(f"Submitted {len(papers)} papers: {result['accepted']} accepted, "
+              f"{result['duplicate']} duplicate, {result['rejected']} rejected")
+
+    def close(self):
+        self.session.close()
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as file:
+        return {line.rstrip('\n') for line in file if line.strip()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import Scopus JSON records in parallel.")
+    parser.add_argument('directory', help="Root directory of the Scopus JSON files")
+    parser.add_argument('--format', choices=['ndjson', 'parquet', 'api'], default='ndjson',
+                        help="Write NDJSON/Parquet, or post directly to the /add_papers endpoint")
+    parser.add_argument('--output', default='output.ndjson', help="Output file for ndjson/parquet")
+    parser.add_argument('--api-url', default='http://localhost:7890', help="Backend URL for --format api")
+    parser.add_argument('--checkpoint', default='import_checkpoint.txt',
+                        help="File listing processed paths; rerun with the same file to resume")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=1000, help="Records per write")
+    args = parser.parse_args(argv)
+
+    directory = os.path.abspath(args.directory)
+    done = load_checkpoint(args.checkpoint)
+    if done:
+        print(f"Resuming: skipping {len(done)} already processed files")
+
+    if args.format == 'ndjson':
+        writer = NdjsonWriter(args.output)
+    elif args.format == 'parquet':
+        writer = ParquetWriter(args.output)
+    else:
+        writer = ApiWriter(args.api_url)
+
+    checkpoint = open(args.checkpoint, 'a', encoding='utf-8')
+    batch, batch_paths = [], []
+    processed = failed = 0
+
+    def flush():
+        # Records are written before their paths are checkpointed, so a crash only repeats work
+        writer.write(batch)
+        checkpoint.write(''.join(path + '\n' for path in batch_paths))
+        checkpoint.flush()
+        batch.clear()
+        batch_paths.clear()
+
+    try:
+        for path, record, error in iter_records(directory, done, args.workers, args.workers * 4):
+            if error is not None:
+                failed += 1
+                print(f"Failed to parse {path}: {error}", file=sys.stderr)
+                continue
+            batch.append(record)
+            batch_paths.append(path)
+            processed += 1
+            if len(batch) >= args.batch_size:
+                flush()
+                print(f"Processed {processed} files ({failed} failed)")
+        if batch:
+            flush()
+    finally:
+        writer.close()
+        checkpoint.close()
+
+    print(f"Done: {processed} files processed, {failed} failed")
+
+
+if __name__ == '__main__':
+    main()